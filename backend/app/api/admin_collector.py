@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from sqlalchemy import case, func
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime, timedelta
+
+from app.db import models, database
+from app.api import deps
+from app.services.principal_cache import Principal
+
+
+
+router = APIRouter()
+
+class CollectorRun(BaseModel):
+    id: int
+    server_id: int
+    started_at: datetime
+    finished_at: datetime
+    status: str
+    upstream_calls: int
+    upstream_ms: int
+    upstream_max_ms: int
+    payload_bytes: int
+    records_parsed: int
+    records_inserted: int
+    records_deduplicated: int
+    db_write_ms: int
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+class CollectorServerSummary(BaseModel):
+    server_id: int
+    runs: int
+    failures: int
+    avg_upstream_ms: float
+    max_upstream_ms: int
+    avg_db_write_ms: float
+    payload_bytes: int
+    records_parsed: int
+    records_inserted: int
+    last_run_at: datetime
+
+
+@router.get("/runs", response_model=List[CollectorRun])
+def read_collector_runs(
+    server_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(database.get_db),
+    current_user: Principal = Depends(deps.get_current_admin_user),
+):
+    """
+    Lists recent traffic collection runs, newest first, optionally for one server.
+    """
+    query = db.query(models.CollectorRun)
+    if server_id is not None:
+        query = query.filter(models.CollectorRun.server_id == server_id)
+    return query.order_by(models.CollectorRun.started_at.desc()).offset(skip).limit(limit).all()
+
+
+@router.get("/summary", response_model=List[CollectorServerSummary])
+def read_collector_summary(
+    hours: int = 24,
+    db: Session = Depends(database.get_db),
+    current_user: Principal = Depends(deps.get_current_admin_user),
+):
+    """
+    Aggregates the collection runs of the last `hours` hours per server.
+    """
+    run = models.CollectorRun
+    rows = (
+        db.query(
+            run.server_id,
+            func.count(run.id).label("runs"),
+            func.sum(case((run.status == 'failed', 1), else_=0)).label("failures"),
+            func.avg(run.upstream_ms).label("avg_upstream_ms"),
+            func.max(run.upstream_max_ms).label("max_upstream_ms"),
+            func.avg(run.db_write_ms).label("avg_db_write_ms"),
+            func.sum(run.payload_bytes).label("payload_bytes"),
+            func.sum(run.records_parsed).label("records_parsed"),
+            func.sum(run.records_inserted).label("records_inserted"),
+            func.max(run.started_at).label("last_run_at"),
+        )
+        .filter(run.started_at >= datetime.utcnow() - timedelta(hours=hours))
+        .group_by(run.server_id)
+        .order_by(run.server_id)
+        .all()
+    )
+    return [CollectorServerSummary(**row._mapping) for row in rows]
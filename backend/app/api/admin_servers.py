@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.db import models, database
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from app.api import deps
-from app.services.flussonic import FlussonicService
-from requests.exceptions import RequestException
+from app.services.principal_cache import Principal
+from app.services.flussonic_async import AsyncFlussonicService
+from app.services.circuit_breaker import CircuitOpenError, breakers
+from app.services.rate_limit import OriginBusyError, limiters
+from app.core.security import generate_ingest_token, hash_ingest_token
+import httpx
 
 
 
@@ -27,56 +32,128 @@ class Server(ServerBase):
     class Config:
         orm_mode = True
 
+class ServerHealth(BaseModel):
+    id: int
+    name: str
+    url: str
+    state: str
+    consecutive_failures: int
+    last_failure_at: Optional[float] = None
+    retry_in_seconds: Optional[float] = None
+    # Rate limiter of this API process for the server
+    in_flight: int
+    queued: int
+    requests: int
+    rejected: int
+    avg_queue_ms: float
+    max_queue_ms: float
+
+def _save_server(db: Session, server: ServerCreate) -> models.FlussonicServer:
+    db_server = models.FlussonicServer(**server.dict())
+    db.add(db_server)
+    db.commit()
+    db.refresh(db_server)
+    return db_server
+
+def _get_server(server_id: int, db: Session = Depends(database.get_db)) -> models.FlussonicServer:
+    # A sync dependency, so async routes resolve the server in the threadpool.
+    db_server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == server_id).first()
+    if not db_server:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
+    return db_server
+
 @router.post("/", response_model=Server, status_code=status.HTTP_201_CREATED)
-def create_server(server: ServerCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(deps.get_current_admin_user)):
+async def create_server(server: ServerCreate, db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_admin_user)):
     # Test connection to Flussonic server before saving
     try:
-        flussonic_service = FlussonicService(
+        flussonic_service = AsyncFlussonicService(
             server_url=server.url,
             username=server.username,
             password=server.password
         )
         # A simple call to test credentials and connectivity.
         # This will raise an exception if it fails.
-        flussonic_service.get_streams()
-    except (RequestException, ValueError) as e:
+        await flussonic_service.get_streams(use_cache=False)
+    except (httpx.HTTPError, ValueError, CircuitOpenError, OriginBusyError) as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to connect to Flussonic server. Please check URL and credentials. Error: {e}"
         )
 
-    db_server = models.FlussonicServer(**server.dict())
-    db.add(db_server)
-    db.commit()
-    db.refresh(db_server)
-    return db_server
+    # Database work runs in the threadpool so a slow database does not block the event loop.
+    return await run_in_threadpool(_save_server, db, server)
 
 
 @router.get("/", response_model=List[Server])
-def read_servers(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(deps.get_current_admin_user)):
+def read_servers(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_admin_user)):
 
     servers = db.query(models.FlussonicServer).offset(skip).limit(limit).all()
     return servers
 
 
-@router.get("/{server_id}/streams", response_model=List[dict])
-def get_server_streams(server_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(deps.get_current_admin_user)):
+def _server_health(server: models.FlussonicServer) -> ServerHealth:
+    key = server.url.rstrip('/')
+    return ServerHealth(
+        id=server.id, name=server.name, url=server.url,
+        **breakers.get(key).snapshot(), **limiters.get(key).snapshot()
+    )
+
+@router.get("/health", response_model=List[ServerHealth])
+def read_servers_health(db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_admin_user)):
     """
-    Retrieves a list of media streams from a specific Flussonic server.
+    Reports the circuit breaker state and the request queue of every
+    registered Flussonic server.
+    """
+    servers = db.query(models.FlussonicServer).all()
+    return [_server_health(server) for server in servers]
+
+
+@router.post("/{server_id}/health/reset", response_model=ServerHealth)
+def reset_server_health(server_id: int, db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_admin_user)):
+    """
+    Closes the circuit breaker of a server, e.g. after it has been repaired.
+    """
+    db_server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == server_id).first()
+    if not db_server:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
+    breakers.get(db_server.url.rstrip('/')).reset()
+    return _server_health(db_server)
+
+
+class IngestToken(BaseModel):
+    server_id: int
+    token: str
+
+@router.post("/{server_id}/ingest-token", response_model=IngestToken)
+def rotate_ingest_token(server_id: int, db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_admin_user)):
+    """
+    Issues a new token for pushing traffic events from this server to
+    /api/ingest/traffic. Any previous token stops working. The token is only
+    shown once.
     """
     db_server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == server_id).first()
     if not db_server:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
+    token = generate_ingest_token()
+    db_server.ingest_token_hash = hash_ingest_token(token)
+    db.commit()
+    return IngestToken(server_id=db_server.id, token=token)
 
+
+@router.get("/{server_id}/streams", response_model=List[dict])
+async def get_server_streams(db_server: models.FlussonicServer = Depends(_get_server), current_user: Principal = Depends(deps.get_current_admin_user)):
+    """
+    Retrieves a list of media streams from a specific Flussonic server.
+    """
     try:
-        flussonic_service = FlussonicService(
+        flussonic_service = AsyncFlussonicService(
             server_url=db_server.url,
             username=db_server.username,
             password=db_server.password
         )
-        streams = flussonic_service.get_streams()
+        streams = await flussonic_service.get_streams()
         return streams
-    except (RequestException, ValueError) as e:
+    except (httpx.HTTPError, ValueError, CircuitOpenError, OriginBusyError) as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Could not fetch streams from Flussonic server. Error: {e}"
@@ -1,22 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.db import models
 from app.db.database import get_db
-from app.core.security import verify_password, create_access_token
+from app.core.config import settings
+from app.core.security import verify_password_async, create_access_token
+from app.services.login_throttle import login_throttle
 from datetime import timedelta
+import math
 
 router = APIRouter()
 
+def _get_user(db: Session, username: str) -> models.User | None:
+    return db.query(models.User).filter(models.User.username == username).first()
+
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # Refuse brute-force bursts before spending any bcrypt time on them.
+    user_key = f"user:{form_data.username.lower()}"
+    ip_key = f"ip:{request.client.host if request.client else 'unknown'}"
+    retry_after = login_throttle.hit([
+        (user_key, settings.LOGIN_MAX_FAILURES_PER_USER),
+        (ip_key, settings.LOGIN_MAX_FAILURES_PER_IP),
+    ])
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    # Keep the blocking lookup off the event loop, like the bcrypt check below.
+    user = await run_in_threadpool(_get_user, db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.reset(user_key)
+    login_throttle.forgive(ip_key)
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
         data={"sub": user.username, "is_admin": user.is_admin}, expires_delta=access_token_expires
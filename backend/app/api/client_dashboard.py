@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
-from datetime import date
-from sqlalchemy import func
+from datetime import date, timedelta
 
 from app.db import models, database
 from app.api import deps
-from app.services.flussonic import FlussonicService
-from requests.exceptions import RequestException
+from app.services.principal_cache import Principal, StreamAccess
+from app.services.flussonic_async import AsyncFlussonicService
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.rate_limit import OriginBusyError
+import httpx
 
 
 
@@ -21,27 +23,30 @@ class StreamInfo(BaseModel):
     # Add other relevant stream info here later, like a preview URL
 
 @router.get("/my-streams", response_model=List[StreamInfo])
-def get_my_streams(db: Session = Depends(database.get_db), current_user: models.User = Depends(deps.get_current_user)):
+def get_my_streams(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: Principal = Depends(deps.get_current_user)):
     """
-    Retrieves the list of streams assigned to the currently authenticated user.
+    Retrieves the list of streams assigned to the currently authenticated user,
+    a page at a time, ordered by server and stream name.
     """
-    user_streams = db.query(models.UserStream).filter(models.UserStream.user_id == current_user.id).all()
-    
-    if not user_streams:
-        return []
-
-    # Enrich stream info with server details
-    result = []
-    for user_stream in user_streams:
-        server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == user_stream.server_id).first()
-        if server:
-            result.append(StreamInfo(
-                name=user_stream.stream_name,
-                server_id=server.id,
-                server_name=server.name
-            ))
-            
-    return result
+    # Load each assignment together with its server in one joined query.
+    user_streams = (
+        db.query(models.UserStream)
+        .options(joinedload(models.UserStream.server))
+        .filter(models.UserStream.user_id == current_user.id)
+        .order_by(models.UserStream.server_id, models.UserStream.stream_name)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [
+        StreamInfo(
+            name=user_stream.stream_name,
+            server_id=user_stream.server.id,
+            server_name=user_stream.server.name
+        )
+        for user_stream in user_streams
+        if user_stream.server is not None
+    ]
 
 # Endpoints for traffic data and push management will be added here.
 
@@ -59,45 +64,121 @@ def get_stream_traffic(
     start_date: date,
     end_date: date,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    access: StreamAccess = Depends(deps.get_stream_access),
 ):
     """
     Retrieves aggregated daily traffic usage data for a specific stream within a date range.
     """
-    # Verify the user has access to this stream.
-    user_stream = (
-        db.query(models.UserStream)
+    # Serve the daily totals from the traffic_daily rollup maintained by the collector,
+    # filtering on a half-open [start_date, end_date + 1 day) range of the key column.
+    traffic_records = (
+        db.query(
+            models.TrafficDaily.day.label("timestamp"),
+            models.TrafficDaily.bytes_used.label("bytes_used"),
+        )
         .filter(
-            models.UserStream.user_id == current_user.id,
-            models.UserStream.stream_name == stream_name,
+            models.TrafficDaily.server_id == access.server_id,
+            models.TrafficDaily.stream_name == stream_name,
+            models.TrafficDaily.day >= start_date,
+            models.TrafficDaily.day < end_date + timedelta(days=1),
         )
-        .first()
+        .order_by(models.TrafficDaily.day.asc())
+        .all()
     )
 
-    if not user_stream:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have access to this stream.",
-        )
+    return traffic_records
 
-    # Fetch and aggregate traffic data from the database for the given stream and date range.
-    traffic_records = (
+
+class TrafficQuery(BaseModel):
+    # Stream names to report on; omit for all of the user's streams.
+    streams: Optional[List[str]] = None
+    # Only report on streams of this server; needed to pick one of several streams with the same name.
+    server_id: Optional[int] = None
+    start_date: date
+    end_date: date
+
+class StreamTraffic(BaseModel):
+    stream_name: str
+    server_id: int
+    total_bytes: int
+    records: List[TrafficRecord]
+
+class MultiStreamTraffic(BaseModel):
+    total_bytes: int
+    streams: List[StreamTraffic]
+
+
+@router.post("/traffic", response_model=MultiStreamTraffic)
+def get_streams_traffic(
+    query: TrafficQuery,
+    db: Session = Depends(database.get_db),
+    current_user: Principal = Depends(deps.get_current_user),
+):
+    """
+    Retrieves daily traffic usage for many streams at once, with per-stream
+    and overall totals, from a single query on the traffic_daily rollup.
+    A user may have streams of the same name on several servers; naming one
+    of those requires `server_id`.
+    """
+    assigned = [
+        access for access in current_user.assignments
+        if query.server_id is None or access.server_id == query.server_id
+    ]
+    if query.streams is None:
+        accesses = assigned
+    else:
+        by_name: Dict[str, List[StreamAccess]] = {}
+        for access in assigned:
+            by_name.setdefault(access.stream_name, []).append(access)
+        denied = [name for name in query.streams if name not in by_name]
+        if denied:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"You do not have access to these streams: {', '.join(denied)}",
+            )
+        ambiguous = [name for name in dict.fromkeys(query.streams) if len(by_name[name]) > 1]
+        if ambiguous:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"These streams exist on several servers, pass server_id: {', '.join(ambiguous)}",
+            )
+        accesses = [by_name[name][0] for name in dict.fromkeys(query.streams)]
+    if not accesses:
+        return MultiStreamTraffic(total_bytes=0, streams=[])
+
+    series: Dict[Tuple[int, str], StreamTraffic] = {
+        (access.server_id, access.stream_name): StreamTraffic(
+            stream_name=access.stream_name, server_id=access.server_id, total_bytes=0, records=[]
+        )
+        for access in accesses
+    }
+    rows = (
         db.query(
-            func.date(models.TrafficUsage.timestamp).label("timestamp"),
-            func.sum(models.TrafficUsage.bytes_used).label("bytes_used"),
+            models.TrafficDaily.server_id,
+            models.TrafficDaily.stream_name,
+            models.TrafficDaily.day,
+            models.TrafficDaily.bytes_used,
         )
         .filter(
-            models.TrafficUsage.stream_name == stream_name,
-            models.TrafficUsage.server_id == user_stream.server_id,
-            func.date(models.TrafficUsage.timestamp) >= start_date,
-            func.date(models.TrafficUsage.timestamp) <= end_date,
+            models.TrafficDaily.server_id.in_({access.server_id for access in accesses}),
+            models.TrafficDaily.stream_name.in_({access.stream_name for access in accesses}),
+            models.TrafficDaily.day >= query.start_date,
+            models.TrafficDaily.day < query.end_date + timedelta(days=1),
         )
-        .group_by(func.date(models.TrafficUsage.timestamp))
-        .order_by(func.date(models.TrafficUsage.timestamp).asc())
+        .order_by(models.TrafficDaily.day.asc())
         .all()
     )
+    for server_id, stream_name, day, bytes_used in rows:
+        # The IN filters also match other servers' streams of the same name; skip those.
+        stream = series.get((server_id, stream_name))
+        if stream is not None:
+            stream.records.append(TrafficRecord(timestamp=day, bytes_used=bytes_used))
+            stream.total_bytes += bytes_used
 
-    return traffic_records
+    return MultiStreamTraffic(
+        total_bytes=sum(stream.total_bytes for stream in series.values()),
+        streams=list(series.values()),
+    )
 
 
 class PushConfig(BaseModel):
@@ -107,74 +188,39 @@ class PushCreate(BaseModel):
     url: str
 
 @router.get("/{stream_name}/pushes", response_model=List[PushConfig])
-def get_stream_pushes(
+async def get_stream_pushes(
     stream_name: str,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    access: StreamAccess = Depends(deps.get_stream_access),
 ):
     """
     Retrieves the list of push configurations for a stream.
     """
-    user_stream = (
-        db.query(models.UserStream)
-        .filter(
-            models.UserStream.user_id == current_user.id,
-            models.UserStream.stream_name == stream_name,
-        )
-        .first()
-    )
-    if not user_stream:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have access to this stream.",
-        )
-    server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == user_stream.server_id).first()
-    if not server:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated server not found.")
-
-    flussonic_service = FlussonicService(server.url, server.username, server.password)
+    flussonic_service = AsyncFlussonicService(access.server_url, access.server_username, access.server_password)
     
     try:
-        stream_config = flussonic_service.get_stream_config(stream_name)
+        stream_config = await flussonic_service.get_stream_config(stream_name)
         pushes = stream_config.get('pushes', [])
         return [PushConfig(url=push.get('url')) for push in pushes if push.get('url')]
-    except (ValueError, RequestException) as e:
+    except (ValueError, httpx.HTTPError, CircuitOpenError, OriginBusyError) as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Could not fetch stream configuration from Flussonic. Error: {e}"
         )
 
 @router.post("/{stream_name}/pushes", status_code=status.HTTP_201_CREATED)
-def add_stream_push(
+async def add_stream_push(
     stream_name: str,
     push_config: PushCreate,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    access: StreamAccess = Depends(deps.get_stream_access),
 ):
     """
     Adds a new push URL to a stream.
     """
-    user_stream = (
-        db.query(models.UserStream)
-        .filter(
-            models.UserStream.user_id == current_user.id,
-            models.UserStream.stream_name == stream_name,
-        )
-        .first()
-    )
-    if not user_stream:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have access to this stream.",
-        )
-    server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == user_stream.server_id).first()
-    if not server:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated server not found.")
-
-    flussonic_service = FlussonicService(server.url, server.username, server.password)
+    flussonic_service = AsyncFlussonicService(access.server_url, access.server_username, access.server_password)
     
     try:
-        current_config = flussonic_service.get_stream_config(stream_name)
+        # Read-modify-write: start from the origin's current pushes, not the cached listing.
+        current_config = await flussonic_service.get_stream_config(stream_name, use_cache=False)
         current_pushes = current_config.get('pushes', [])
         
         if any(p.get('url') == push_config.url for p in current_pushes):
@@ -184,45 +230,28 @@ def add_stream_push(
             )
 
         new_pushes = current_pushes + [{"url": push_config.url}]
-        flussonic_service.update_stream_config(stream_name, {"pushes": new_pushes})
+        await flussonic_service.update_stream_config(stream_name, {"pushes": new_pushes})
         return {"message": "Push configuration added successfully."}
-    except (ValueError, RequestException) as e:
+    except (ValueError, httpx.HTTPError, CircuitOpenError, OriginBusyError) as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Could not update stream configuration on Flussonic. Error: {e}"
         )
 
 @router.delete("/{stream_name}/pushes", status_code=status.HTTP_200_OK)
-def remove_stream_push(
+async def remove_stream_push(
     stream_name: str,
     push_to_delete: PushCreate, # Re-use PushCreate as it has the same structure
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    access: StreamAccess = Depends(deps.get_stream_access),
 ):
     """
     Removes a push URL from a stream.
     """
-    user_stream = (
-        db.query(models.UserStream)
-        .filter(
-            models.UserStream.user_id == current_user.id,
-            models.UserStream.stream_name == stream_name,
-        )
-        .first()
-    )
-    if not user_stream:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have access to this stream.",
-        )
-    server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == user_stream.server_id).first()
-    if not server:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated server not found.")
-
-    flussonic_service = FlussonicService(server.url, server.username, server.password)
+    flussonic_service = AsyncFlussonicService(access.server_url, access.server_username, access.server_password)
 
     try:
-        current_config = flussonic_service.get_stream_config(stream_name)
+        # Read-modify-write: start from the origin's current pushes, not the cached listing.
+        current_config = await flussonic_service.get_stream_config(stream_name, use_cache=False)
         current_pushes = current_config.get('pushes', [])
         
         updated_pushes = [p for p in current_pushes if p.get('url') != push_to_delete.url]
@@ -233,9 +262,9 @@ def remove_stream_push(
                 detail="Push URL not found in stream configuration."
             )
 
-        flussonic_service.update_stream_config(stream_name, {"pushes": updated_pushes})
+        await flussonic_service.update_stream_config(stream_name, {"pushes": updated_pushes})
         return {"message": "Push configuration removed successfully."}
-    except (ValueError, RequestException) as e:
+    except (ValueError, httpx.HTTPError, CircuitOpenError, OriginBusyError) as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Could not update stream configuration on Flussonic. Error: {e}"
@@ -1,13 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.security import hash_ingest_token
 from app.db import models, database
+from app.services.principal_cache import Principal, StreamAccess, load_principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -21,15 +23,42 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    # Resolved principals are cached, so the database is only hit on a miss.
+    principal = principal_cache.get(username)
+    if principal is None:
+        principal = load_principal(db, username)
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(principal)
+    return principal
 
-def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+def get_current_admin_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user doesn't have enough privileges"
         )
     return current_user
+
+def get_stream_access(stream_name: str, current_user: Principal = Depends(get_current_user)) -> StreamAccess:
+    """Authorizes access to the `stream_name` path parameter from the cached principal, without a query."""
+    access = current_user.streams.get(stream_name)
+    if access is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have access to this stream.",
+        )
+    return access
+
+def get_ingest_server(x_ingest_token: str = Header(...), db: Session = Depends(database.get_db)):
+    server = (
+        db.query(models.FlussonicServer)
+        .filter(models.FlussonicServer.ingest_token_hash == hash_ingest_token(x_ingest_token))
+        .first()
+    )
+    if server is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid ingest token",
+        )
+    return server
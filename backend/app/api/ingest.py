@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Tuple
+from datetime import datetime, timedelta
+import time
+
+from app.core.config import settings
+from app.db import models, database
+from app.api import deps
+from app.services.rollups import refresh_server_rollups
+from app.services.traffic_writer import upsert_traffic
+
+
+
+router = APIRouter()
+
+# How far ahead of this server's clock an event may be, to allow for clock skew.
+MAX_CLOCK_SKEW_MS = 5 * 60 * 1000
+
+class TrafficEvent(BaseModel):
+    stream: str = Field(..., min_length=1, max_length=100)
+    timestamp: int = Field(..., gt=0, description="Start of the interval, in Unix milliseconds")
+    bytes: int = Field(..., ge=0, description="Bytes sent for the stream during the interval")
+
+class TrafficBatch(BaseModel):
+    events: List[TrafficEvent] = Field(..., max_length=settings.INGEST_MAX_EVENTS)
+
+
+def _hour_ranges(timestamps: List[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Merges the hours touched by `timestamps` into runs of consecutive hours, as (first, last) pairs."""
+    hours = sorted({timestamp.replace(minute=0, second=0, microsecond=0) for timestamp in timestamps})
+    ranges = [[hours[0], hours[0]]]
+    for hour in hours[1:]:
+        if hour - ranges[-1][1] <= timedelta(hours=1):
+            ranges[-1][1] = hour
+        else:
+            ranges.append([hour, hour])
+    return [(first, last) for first, last in ranges]
+
+
+@router.post("/traffic", status_code=status.HTTP_202_ACCEPTED)
+def ingest_traffic(
+    batch: TrafficBatch,
+    db: Session = Depends(database.get_db),
+    server: models.FlussonicServer = Depends(deps.get_ingest_server),
+):
+    """
+    Accepts traffic data pushed by a Flussonic server or a local relay,
+    authenticated with the server's `X-Ingest-Token`.
+
+    Events use the same shape as polled traffic reports: one total per stream
+    and interval. They are written through the same bulk upsert and rollup path
+    as the collector, so re-sending an event replaces the stored value instead
+    of counting it twice. Events older than `INGEST_MAX_AGE_HOURS` or in the
+    future are rejected; use the backfill command for history.
+    """
+    if not batch.events:
+        return {"accepted": 0}
+
+    now_ms = int(time.time() * 1000)
+    oldest_ms = now_ms - settings.INGEST_MAX_AGE_HOURS * 3600 * 1000
+    newest_ms = now_ms + MAX_CLOCK_SKEW_MS
+    rejected = [event.timestamp for event in batch.events if not oldest_ms <= event.timestamp <= newest_ms]
+    if rejected:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{len(rejected)} events have timestamps outside the last {settings.INGEST_MAX_AGE_HOURS} hours.",
+        )
+
+    rows = [
+        (server.id, event.stream, datetime.utcfromtimestamp(event.timestamp / 1000), event.bytes)
+        for event in batch.events
+    ]
+    upsert_traffic(db, rows)
+    db.commit()
+    # Only rebuild the hours that received data, not everything between the oldest and newest event.
+    refresh_server_rollups(server.id, _hour_ranges([row[2] for row in rows]))
+    return {"accepted": len(rows)}
@@ -14,5 +14,57 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    LOGIN_MAX_FAILURES_PER_USER: int = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", 5))
+    LOGIN_MAX_FAILURES_PER_IP: int = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", 20))
+    LOGIN_THROTTLE_WINDOW_SECONDS: float = float(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", 300))
+
+    # Flussonic API client settings
+    FLUSSONIC_TIMEOUT: float = float(os.getenv("FLUSSONIC_TIMEOUT", 15))
+    FLUSSONIC_POOL_SIZE: int = int(os.getenv("FLUSSONIC_POOL_SIZE", 10))
+    FLUSSONIC_KEEPALIVE: bool = os.getenv("FLUSSONIC_KEEPALIVE", "true").lower() == "true"
+    FLUSSONIC_POOL_IDLE_TIMEOUT: float = float(os.getenv("FLUSSONIC_POOL_IDLE_TIMEOUT", 300))
+    FLUSSONIC_MEDIA_CACHE_TTL: float = float(os.getenv("FLUSSONIC_MEDIA_CACHE_TTL", 30))
+    FLUSSONIC_MEDIA_CACHE_SIZE: int = int(os.getenv("FLUSSONIC_MEDIA_CACHE_SIZE", 100))
+    FLUSSONIC_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("FLUSSONIC_BREAKER_FAILURE_THRESHOLD", 5))
+    FLUSSONIC_BREAKER_COOLDOWN: float = float(os.getenv("FLUSSONIC_BREAKER_COOLDOWN", 30))
+    FLUSSONIC_TRAFFIC_CHUNK_SIZE: int = int(os.getenv("FLUSSONIC_TRAFFIC_CHUNK_SIZE", 100))
+    FLUSSONIC_TRAFFIC_CONCURRENCY: int = int(os.getenv("FLUSSONIC_TRAFFIC_CONCURRENCY", 4))
+    FLUSSONIC_RATE_LIMIT: float = float(os.getenv("FLUSSONIC_RATE_LIMIT", 10))
+    FLUSSONIC_RATE_BURST: int = int(os.getenv("FLUSSONIC_RATE_BURST", 20))
+    FLUSSONIC_MAX_IN_FLIGHT: int = int(os.getenv("FLUSSONIC_MAX_IN_FLIGHT", 8))
+    FLUSSONIC_RATE_MAX_WAIT: float = float(os.getenv("FLUSSONIC_RATE_MAX_WAIT", 10))
+    FLUSSONIC_RATE_PROCESSES: int = int(os.getenv("FLUSSONIC_RATE_PROCESSES", 1))
+
+    # Usage collector settings
+    COLLECTOR_CONCURRENCY: int = int(os.getenv("COLLECTOR_CONCURRENCY", 8))
+    COLLECTOR_SERVER_TIMEOUT: float = float(os.getenv("COLLECTOR_SERVER_TIMEOUT", 300))
+    COLLECTOR_BATCH_SIZE: int = int(os.getenv("COLLECTOR_BATCH_SIZE", 1000))
+    COLLECTOR_QUEUE_SIZE: int = int(os.getenv("COLLECTOR_QUEUE_SIZE", 8))
+    COLLECTOR_INITIAL_LOOKBACK_HOURS: int = int(os.getenv("COLLECTOR_INITIAL_LOOKBACK_HOURS", 24))
+    COLLECTOR_OVERLAP_MINUTES: int = int(os.getenv("COLLECTOR_OVERLAP_MINUTES", 15))
+    COLLECTOR_INTERVAL_SECONDS: float = float(os.getenv("COLLECTOR_INTERVAL_SECONDS", 3600))
+    COLLECTOR_JITTER_SECONDS: float = float(os.getenv("COLLECTOR_JITTER_SECONDS", 60))
+    COLLECTOR_REFRESH_SECONDS: float = float(os.getenv("COLLECTOR_REFRESH_SECONDS", 300))
+    COLLECTOR_NODE_ID: str = os.getenv("COLLECTOR_NODE_ID", "")
+    COLLECTOR_LEASE_TTL_SECONDS: float = float(os.getenv("COLLECTOR_LEASE_TTL_SECONDS", 120))
+    COLLECTOR_LEASE_HEARTBEAT_SECONDS: float = float(os.getenv("COLLECTOR_LEASE_HEARTBEAT_SECONDS", 30))
+
+    # Push-based traffic ingestion
+    INGEST_MAX_EVENTS: int = int(os.getenv("INGEST_MAX_EVENTS", 10000))
+    INGEST_MAX_AGE_HOURS: int = int(os.getenv("INGEST_MAX_AGE_HOURS", 48))
+
+    # Historical backfill settings
+    BACKFILL_WINDOW_HOURS: int = int(os.getenv("BACKFILL_WINDOW_HOURS", 24))
+    BACKFILL_CONCURRENCY: int = int(os.getenv("BACKFILL_CONCURRENCY", 4))
+    BACKFILL_MIN_INTERVAL_SECONDS: float = float(os.getenv("BACKFILL_MIN_INTERVAL_SECONDS", 1))
+
+    # Traffic data retention settings
+    TRAFFIC_RAW_RETENTION_DAYS: int = int(os.getenv("TRAFFIC_RAW_RETENTION_DAYS", 90))
+    TRAFFIC_HOURLY_RETENTION_DAYS: int = int(os.getenv("TRAFFIC_HOURLY_RETENTION_DAYS", 400))
+    TRAFFIC_PARTITION_MONTHS_AHEAD: int = int(os.getenv("TRAFFIC_PARTITION_MONTHS_AHEAD", 2))
+    TRAFFIC_RETENTION_INTERVAL_SECONDS: float = float(os.getenv("TRAFFIC_RETENTION_INTERVAL_SECONDS", 86400))
 
 settings = Settings()
@@ -1,7 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Date, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base
-import datetime
 
 class User(Base):
     __tablename__ = "users"
@@ -9,8 +8,6 @@ class User(Base):
     username = Column(String(50), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_admin = Column(Integer, default=0) # 0 for client, 1 for admin
-    
-    streams = relationship("Stream", secondary="user_streams")
 
 class FlussonicServer(Base):
     __tablename__ = "flussonic_servers"
@@ -19,6 +16,10 @@ class FlussonicServer(Base):
     url = Column(String(255), nullable=False, unique=True)
     username = Column(String(100), nullable=False)
     password = Column(String(100), nullable=False)
+    # Seconds between traffic collections by the collector daemon; NULL uses the default.
+    collection_interval = Column(Integer, nullable=True)
+    # SHA-256 of the token the server (or its relay) uses to push traffic events.
+    ingest_token_hash = Column(String(64), nullable=True, unique=True, index=True)
 
 class Stream(Base):
     __tablename__ = "streams"
@@ -27,18 +28,106 @@ class Stream(Base):
     server_id = Column(Integer, ForeignKey("flussonic_servers.id"))
     
     server = relationship("FlussonicServer")
-    users = relationship("User", secondary="user_streams")
 
 class UserStream(Base):
     __tablename__ = "user_streams"
+    # Streams are assigned by name on a given server, as they appear in Flussonic.
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
-    stream_id = Column(Integer, ForeignKey("streams.id"), primary_key=True)
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    stream_name = Column(String(100), primary_key=True)
+
+    server = relationship("FlussonicServer")
 
 class TrafficUsage(Base):
     __tablename__ = "traffic_usage"
+    __table_args__ = (
+        # Time range scans across all streams (rollup rebuilds, retention).
+        Index("ix_traffic_usage_timestamp", "timestamp"),
+    )
+    # One row per traffic data point. The collector upserts against this key, and
+    # (server, stream, time range) queries are index range scans on it. The key
+    # includes `timestamp` and there is no foreign key on `server_id` because
+    # MySQL requires both for range-partitioning the table by month.
+    server_id = Column(Integer, primary_key=True)
+    stream_name = Column(String(100), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False)
+
+class CollectionWatermark(Base):
+    __tablename__ = "collection_watermarks"
+    # The newest traffic data point stored for a server; the collector resumes from here.
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    last_timestamp = Column(DateTime, nullable=False)
+
+class TrafficHourly(Base):
+    __tablename__ = "traffic_hourly"
+    # Rollup of traffic_usage per server, stream and hour, maintained by the collector.
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    stream_name = Column(String(100), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False)
+
+class TrafficDaily(Base):
+    __tablename__ = "traffic_daily"
+    # Rollup of traffic_hourly per server, stream and day.
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    stream_name = Column(String(100), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False)
+
+class UserTrafficDaily(Base):
+    __tablename__ = "user_traffic_daily"
+    # Daily traffic summed over all streams assigned to a user.
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False)
+
+class JobLock(Base):
+    __tablename__ = "job_locks"
+    # A named row that maintenance jobs lock to run one at a time across processes,
+    # or lease (owner until expires_at, on the database clock) to run on one daemon only.
+    name = Column(String(50), primary_key=True)
+    locked_at = Column(DateTime, nullable=True)
+    owner = Column(String(100), nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+class BackfillWindow(Base):
+    __tablename__ = "backfill_windows"
+    # A historical time window that has been loaded for a server; lets backfills resume.
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    window_end = Column(DateTime, primary_key=True)
+    records = Column(Integer, nullable=False)
+    completed_at = Column(DateTime, nullable=False)
+
+class CollectorRun(Base):
+    __tablename__ = "collector_runs"
+    # Metrics of one traffic collection of one server.
     id = Column(Integer, primary_key=True, index=True)
-    stream_id = Column(Integer, ForeignKey("streams.id"))
-    date = Column(DateTime, default=datetime.datetime.utcnow)
-    usage_gb = Column(Float, nullable=False)
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), nullable=False, index=True)
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False) # 'success', 'no_streams' or 'failed'
+    upstream_calls = Column(Integer, nullable=False, default=0)
+    upstream_ms = Column(Integer, nullable=False, default=0)
+    upstream_max_ms = Column(Integer, nullable=False, default=0)
+    payload_bytes = Column(BigInteger, nullable=False, default=0)
+    records_parsed = Column(Integer, nullable=False, default=0)
+    # Data points that were new, and parsed points that were already stored or repeated in the report.
+    records_inserted = Column(Integer, nullable=False, default=0)
+    records_deduplicated = Column(Integer, nullable=False, default=0)
+    db_write_ms = Column(Integer, nullable=False, default=0)
+    error = Column(String(500), nullable=True)
+
+class CollectorNode(Base):
+    __tablename__ = "collector_nodes"
+    # A running collector daemon; used to split the servers fairly between daemons.
+    owner = Column(String(100), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False)
 
-    stream = relationship("Stream")
+class CollectorLease(Base):
+    __tablename__ = "collector_leases"
+    # Which collector daemon currently polls a server, until the lease expires.
+    server_id = Column(Integer, ForeignKey("flussonic_servers.id"), primary_key=True)
+    owner = Column(String(100), nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=True)
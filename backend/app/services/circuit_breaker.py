@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Any, Dict
+
+from app.core.config import settings
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an origin whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a single Flussonic origin.
+
+    After `failure_threshold` consecutive failures (connection errors, timeouts
+    or 5xx responses) the circuit opens and calls fail fast with
+    `CircuitOpenError`. Once `cooldown` seconds have passed a single trial call
+    is let through (half-open): success closes the circuit, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.last_failure_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raises `CircuitOpenError` if the call must not reach the origin."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError("Flussonic server is marked as unavailable; retrying after cool-down.")
+
+    def cancel_call(self) -> None:
+        """Undoes `before_call` for a call that never reached the origin."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_result(self, healthy: bool) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+            if healthy:
+                self.state = self.CLOSED
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.consecutive_failures += 1
+            self.last_failure_at = time.time()
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        self.record_result(True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'last_failure_at': self.last_failure_at,
+                'retry_in_seconds': retry_in,
+            }
+
+
+class BreakerRegistry:
+    """One `CircuitBreaker` per Flussonic server, keyed by base URL."""
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.cooldown)
+                self._breakers[key] = breaker
+            return breaker
+
+
+breakers = BreakerRegistry(
+    failure_threshold=settings.FLUSSONIC_BREAKER_FAILURE_THRESHOLD,
+    cooldown=settings.FLUSSONIC_BREAKER_COOLDOWN,
+)
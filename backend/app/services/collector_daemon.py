@@ -0,0 +1,190 @@
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models, database
+from app.services.http_pool import session_pool
+from app.services.job_locks import release_lease, try_lease
+from app.services.leases import LeaseManager, default_owner
+from app.services.retention import apply_retention
+from app.services.usage_collector import collect_server_usage
+
+
+class CollectorDaemon:
+    """
+    A resident alternative to running `collect_usage_data` from cron.
+
+    Every server is collected on its own schedule (its `collection_interval`,
+    or `COLLECTOR_INTERVAL_SECONDS`), with a random start offset of up to
+    `COLLECTOR_JITTER_SECONDS` so origins are not all hit at the same instant.
+    A server is never collected twice at once: if its previous run is still
+    going when it becomes due again, that slot is skipped. Traffic retention
+    runs every `TRAFFIC_RETENTION_INTERVAL_SECONDS`. The process keeps its DB
+    engine and Flussonic sessions warm between runs.
+
+    Several daemons can run on different hosts: each only collects the servers
+    it holds a lease for (see `LeaseManager`), and the servers are re-balanced
+    when daemons start, stop or die. Retention only runs on the daemon that
+    holds the `retention` lease.
+    """
+    def __init__(
+        self,
+        default_interval: float = settings.COLLECTOR_INTERVAL_SECONDS,
+        jitter: float = settings.COLLECTOR_JITTER_SECONDS,
+        concurrency: int = settings.COLLECTOR_CONCURRENCY,
+        refresh_interval: float = settings.COLLECTOR_REFRESH_SECONDS,
+        retention_interval: float = settings.TRAFFIC_RETENTION_INTERVAL_SECONDS,
+        lease_ttl: float = settings.COLLECTOR_LEASE_TTL_SECONDS,
+        heartbeat_interval: float = settings.COLLECTOR_LEASE_HEARTBEAT_SECONDS,
+    ):
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.refresh_interval = refresh_interval
+        self.retention_interval = retention_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._leases = LeaseManager(default_owner(), lease_ttl)
+        self._retention_leader = False
+        self._retention_running = False
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._intervals: Dict[int, float] = {}
+        self._next_run: Dict[int, float] = {}
+        self._running: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _jitter(self) -> float:
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+
+    def _refresh_servers(self) -> None:
+        """Picks up servers that were added, removed or re-configured since the last refresh."""
+        db: Session = database.SessionLocal()
+        try:
+            rows = db.query(models.FlussonicServer.id, models.FlussonicServer.collection_interval).all()
+        finally:
+            db.close()
+
+        now = time.monotonic()
+        current = set()
+        for server_id, interval in rows:
+            current.add(server_id)
+            self._intervals[server_id] = interval or self.default_interval
+            if server_id not in self._next_run:
+                self._next_run[server_id] = now + self._jitter()
+        for server_id in set(self._next_run) - current:
+            del self._next_run[server_id]
+            del self._intervals[server_id]
+
+    def _sync_leases(self) -> None:
+        with self._lock:
+            busy = set(self._running)
+        before = set(self._leases.owned)
+        owned = self._leases.sync(self._intervals.keys(), busy)
+        if owned != before:
+            print(f"Collector {self._leases.owner} now holds {len(owned)} of {len(self._intervals)} servers.")
+        db: Session = database.SessionLocal()
+        try:
+            leader = try_lease(db, 'retention', self._leases.owner, self._leases.ttl)
+        finally:
+            db.close()
+        if leader != self._retention_leader:
+            print(f"Collector {self._leases.owner} {'now runs' if leader else 'no longer runs'} traffic retention.")
+        self._retention_leader = leader
+
+    def _collect(self, server_id: int) -> None:
+        try:
+            collect_server_usage(server_id)
+        except Exception as e:
+            print(f"Unexpected error collecting server {server_id}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(server_id)
+
+    def _dispatch_due(self, now: float) -> None:
+        for server_id, due in list(self._next_run.items()):
+            if due > now:
+                continue
+            self._next_run[server_id] = now + self._intervals[server_id] + self._jitter()
+            if not self._leases.holds(server_id):
+                continue
+            with self._lock:
+                if server_id in self._running:
+                    print(f"Server {server_id} is still being collected; skipping this run.")
+                    continue
+                self._running.add(server_id)
+            self._executor.submit(self._collect, server_id)
+
+    def _retention(self) -> None:
+        try:
+            apply_retention()
+        finally:
+            with self._lock:
+                self._retention_running = False
+
+    def _dispatch_retention(self) -> None:
+        if not self._retention_leader:
+            return
+        with self._lock:
+            if self._retention_running:
+                return
+            self._retention_running = True
+        self._executor.submit(self._retention)
+
+    def stop(self, *_) -> None:
+        """Requests a graceful shutdown; in-flight collections are allowed to finish."""
+        print("Stopping collector daemon...")
+        self._stop.set()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print("Collector daemon started.")
+
+        next_refresh = 0.0
+        next_heartbeat = 0.0
+        next_retention = time.monotonic() + self._jitter() if self.retention_interval > 0 else float('inf')
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_refresh:
+                    try:
+                        self._refresh_servers()
+                    except Exception as e:
+                        print(f"Could not refresh server list: {e}")
+                    next_refresh = now + self.refresh_interval
+                if now >= next_heartbeat:
+                    try:
+                        self._sync_leases()
+                    except Exception as e:
+                        print(f"Could not renew collector leases: {e}")
+                        self._retention_leader = False
+                    next_heartbeat = now + self.heartbeat_interval
+                self._dispatch_due(now)
+                if now >= next_retention:
+                    self._dispatch_retention()
+                    next_retention = now + self.retention_interval
+
+                next_due = min(self._next_run.values(), default=next_refresh)
+                self._stop.wait(timeout=max(0.5, min(next_due, next_refresh, next_heartbeat, next_retention) - time.monotonic()))
+        finally:
+            self._executor.shutdown(wait=True)
+            try:
+                self._leases.release_all()
+                db: Session = database.SessionLocal()
+                try:
+                    release_lease(db, 'retention', self._leases.owner)
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"Could not release collector leases: {e}")
+            session_pool.close()
+            print("Collector daemon stopped.")
+
+
+def run_collector_daemon():
+    CollectorDaemon().run()
@@ -1,23 +1,118 @@
+import hashlib
 import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
 from requests.auth import HTTPBasicAuth
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.services.circuit_breaker import breakers
+from app.services.media_cache import media_cache
+from app.services.singleflight import SingleFlight
+from app.services.http_pool import session_pool
+from app.services.rate_limit import OriginBusyError, limiters
+
+try:
+    import ijson
+except ImportError:  # Traffic reports are then parsed in one piece.
+    ijson = None
+
+# (stream_name, timestamp_ms, bytes)
+TrafficRecord = Tuple[str, int, int]
+
+def chunk_streams(streams: List[str]) -> List[List[str]]:
+    """Splits a stream list so each traffic report request stays within URL length limits."""
+    size = max(1, settings.FLUSSONIC_TRAFFIC_CHUNK_SIZE)
+    return [streams[i:i + size] for i in range(0, len(streams), size)]
+
+class UpstreamStats:
+    """
+    Thread-safe totals of the upstream calls made by a `FlussonicService`,
+    used by the collector to report per-server latency and payload size.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.payload_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float, payload_bytes: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.payload_bytes += payload_bytes
+
+# Shared by every service instance so identical GETs coalesce across requests.
+_inflight = SingleFlight()
+
+def credentials_key(username: str, password: str) -> str:
+    """Identifies a set of credentials in single-flight keys without keeping the password in them."""
+    return hashlib.sha256(f"{username}\0{password}".encode()).hexdigest()
 
 class FlussonicService:
     """
     A service class to interact with the Flussonic Media Server API.
     """
-    def __init__(self, server_url: str, username: str, password: str):
+    def __init__(self, server_url: str, username: str, password: str, timeout: float = settings.FLUSSONIC_TIMEOUT):
         if not server_url.startswith(('http://', 'https://')):
             raise ValueError("Server URL must start with http:// or https://")
         
         self.base_url = server_url.rstrip('/')
         self.auth = HTTPBasicAuth(username, password)
+        self.credentials_key = credentials_key(username, password)
+        self.timeout = timeout
+        # Connections are pooled per server, so every service instance for the
+        # same origin shares the same keep-alive session.
+        self.session = session_pool.get(self.base_url)
+        # Optional `UpstreamStats` that every upstream call made by this instance is recorded in.
+        self.stats: Optional[UpstreamStats] = None
+        # Optional `time.monotonic()` value after which this instance makes no more
+        # upstream calls; request timeouts are shortened to fit within it.
+        self.deadline: Optional[float] = None
+
+    def _request_timeout(self) -> float:
+        if self.deadline is None:
+            return self.timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline for calls to the Flussonic server has passed.")
+        return min(self.timeout, remaining)
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Any:
-        """Helper method to make requests to the Flussonic API."""
+        """
+        Helper method to make requests to the Flussonic API.
+        Concurrent identical GETs to the same server share one upstream request.
+        """
+        if method != 'GET':
+            return self._send_request(method, endpoint, **kwargs)
+        params = kwargs.get('params') or {}
+        # Calls made with different credentials must not share a result.
+        key = (self.base_url, self.credentials_key, endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+        return _inflight.do(key, lambda: self._send_request(method, endpoint, **kwargs))
+
+    def _send_request(self, method: str, endpoint: str, **kwargs) -> Any:
         url = f"{self.base_url}{endpoint}"
+        timeout = self._request_timeout()
+        # Fail fast while the origin's circuit is open; 5xx responses and
+        # transport errors count against it, 4xx responses do not.
+        breaker = breakers.get(self.base_url)
+        breaker.before_call()
+        # Wait for a slot within the origin's rate and concurrency limits.
+        limiter = limiters.get(self.base_url)
         try:
-            response = requests.request(method, url, auth=self.auth, timeout=15, **kwargs)
+            limiter.acquire()
+        except OriginBusyError:
+            breaker.cancel_call()
+            raise
+        healthy = False
+        response = None
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, auth=self.auth, timeout=timeout, **kwargs)
+            healthy = response.status_code < 500
             response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
             if response.status_code == 204:
                 return None
@@ -38,38 +133,195 @@ class FlussonicService:
             # Handle other request exceptions
             print(f"An unexpected error occurred: {req_err}")
             raise
+        finally:
+            limiter.release()
+            breaker.record_result(healthy)
+            if self.stats is not None:
+                self.stats.record((time.perf_counter() - started) * 1000, len(response.content) if response is not None else 0)
+
+    def _get_media(self, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Returns the `/flussonic/api/media` listing with its name index, served
+        from the per-server media cache while it is fresh. With `use_cache=False`
+        the listing is always fetched by a new request.
+        """
+        if use_cache:
+            entry = media_cache.get(self.base_url)
+            if entry is not None:
+                return entry
+            response_data = self._make_request('GET', '/flussonic/api/media')
+        else:
+            # A fresh read must not join a listing requested before the call.
+            response_data = self._send_request('GET', '/flussonic/api/media')
+        return media_cache.set(self.base_url, response_data.get('streams', []))
 
-    def get_streams(self) -> list:
+    def get_streams(self, use_cache: bool = True) -> list:
         """
         Fetches a list of all media streams from the Flussonic server.
         Corresponds to the `/flussonic/api/media` endpoint.
         """
-        response_data = self._make_request('GET', '/flussonic/api/media')
-        return response_data.get('streams', [])
+        return self._get_media(use_cache)['streams']
 
     def get_traffic_report(self, streams: List[str], start_time: int) -> Dict[str, Any]:
         """
         Fetches traffic reports for a list of streams since a given time.
         Corresponds to GET /flussonic/api/get_traffic_reports
+        Long stream lists are split into chunks that are requested in parallel
+        and merged back into a single stream -> records dict.
         """
+        chunks = chunk_streams(streams)
+        if len(chunks) <= 1:
+            return self._get_traffic_chunk(streams, start_time)
+
+        report: Dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=min(settings.FLUSSONIC_TRAFFIC_CONCURRENCY, len(chunks))) as executor:
+            for chunk_report in executor.map(lambda chunk: self._get_traffic_chunk(chunk, start_time), chunks):
+                report.update(chunk_report or {})
+        return report
+
+    def _get_traffic_chunk(self, streams: List[str], start_time: int, end_time: Optional[int] = None) -> Dict[str, Any]:
         params = {
             'streams': ','.join(streams),
             'from': start_time
         }
+        if end_time is not None:
+            params['to'] = end_time
         return self._make_request('GET', '/flussonic/api/get_traffic_reports', params=params)
 
-    def get_stream_config(self, stream_name: str) -> Dict[str, Any]:
+    def iter_traffic_report(self, streams: List[str], start_time: int, end_time: Optional[int] = None) -> Iterator[TrafficRecord]:
+        """
+        Streaming variant of `get_traffic_report` that yields one
+        (stream_name, timestamp_ms, bytes) record at a time, optionally
+        bounded by `end_time` (Unix seconds).
+        Chunks are fetched in parallel and handed over through a bounded queue,
+        so fetching pauses while the consumer is busy and memory use does not
+        grow with the size of the origin.
+        """
+        chunks = chunk_streams(streams)
+        if len(chunks) <= 1:
+            yield from self._iter_traffic_chunk(streams, start_time, end_time)
+            return
+
+        queue: Queue = Queue(maxsize=settings.COLLECTOR_QUEUE_SIZE)
+        stop = threading.Event()
+        chunk_done = object()
+
+        def put(item) -> None:
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.5)
+                    return
+                except Full:
+                    continue
+
+        def produce(chunk: List[str]) -> None:
+            try:
+                batch: List[TrafficRecord] = []
+                for record in self._iter_traffic_chunk(chunk, start_time, end_time):
+                    if stop.is_set():
+                        return
+                    batch.append(record)
+                    if len(batch) >= settings.COLLECTOR_BATCH_SIZE:
+                        put(batch)
+                        batch = []
+                if batch:
+                    put(batch)
+                put(chunk_done)
+            except Exception as e:
+                put(e)
+
+        executor = ThreadPoolExecutor(max_workers=min(settings.FLUSSONIC_TRAFFIC_CONCURRENCY, len(chunks)))
+        try:
+            for chunk in chunks:
+                executor.submit(produce, chunk)
+            remaining = len(chunks)
+            while remaining:
+                item = queue.get()
+                if item is chunk_done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            # Unblock and cancel producers if the consumer stops early or a chunk failed.
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_traffic_chunk(self, streams: List[str], start_time: int, end_time: Optional[int] = None) -> Iterator[TrafficRecord]:
+        if ijson is None:
+            for stream_name, usage_list in (self._get_traffic_chunk(streams, start_time, end_time) or {}).items():
+                for usage_record in usage_list:
+                    yield stream_name, usage_record[0], usage_record[1]
+            return
+
+        params = {
+            'streams': ','.join(streams),
+            'from': start_time
+        }
+        if end_time is not None:
+            params['to'] = end_time
+        url = f"{self.base_url}/flussonic/api/get_traffic_reports"
+        timeout = self._request_timeout()
+        breaker = breakers.get(self.base_url)
+        breaker.before_call()
+        # The slot is held until the origin answers. The body is then read at
+        # the consumer's pace, which must not keep other calls waiting.
+        limiter = limiters.get(self.base_url)
+        try:
+            limiter.acquire()
+        except OriginBusyError:
+            breaker.cancel_call()
+            raise
+        healthy = False
+        holds_slot = True
+        response = None
+        started = time.perf_counter()
+        try:
+            with self.session.get(url, params=params, auth=self.auth, timeout=timeout, stream=True) as response:
+                limiter.release()
+                holds_slot = False
+                healthy = response.status_code < 500
+                response.raise_for_status()
+                response.raw.decode_content = True
+                # Parse one stream's records at a time instead of the whole document.
+                for stream_name, usage_list in ijson.kvitems(response.raw, ''):
+                    # The request timeout only bounds each read, so check the deadline while reading.
+                    if self.deadline is not None and time.monotonic() > self.deadline:
+                        raise TimeoutError("Deadline for calls to the Flussonic server has passed.")
+                    for usage_record in usage_list:
+                        yield stream_name, int(usage_record[0]), int(usage_record[1])
+        except requests.exceptions.RequestException as req_err:
+            print(f"Error streaming traffic report: {req_err}")
+            raise
+        finally:
+            if holds_slot:
+                limiter.release()
+            breaker.record_result(healthy)
+            if self.stats is not None:
+                self.stats.record((time.perf_counter() - started) * 1000, response.raw.tell() if response is not None else 0)
+
+    def get_stream_config(self, stream_name: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Fetches the full configuration for a specific stream.
         This is a workaround as there is no direct public API to get a single stream's config
         in a simple way other than parsing the full config. This is more reliable.
+        Pass `use_cache=False` when the result is modified and written back, so
+        changes made elsewhere since the listing was cached are not overwritten.
+        """
+        stream = self._get_media(use_cache)['index'].get(stream_name)
+        if stream is None:
+            raise ValueError(f"Stream '{stream_name}' not found.")
+        # The 'config' key holds the editable configuration
+        return stream.get('config', {})
+
+    def get_stream_configs(self, stream_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolves the configuration of many streams from a single media listing.
+        Streams that do not exist on the server are left out of the result.
         """
-        all_streams_data = self._make_request('GET', '/flussonic/api/media')
-        for stream in all_streams_data.get('streams', []):
-            if stream.get('name') == stream_name:
-                # The 'config' key holds the editable configuration
-                return stream.get('config', {})
-        raise ValueError(f"Stream '{stream_name}' not found.")
+        index = self._get_media()['index']
+        return {name: index[name].get('config', {}) for name in stream_names if name in index}
 
     def update_stream_config(self, stream_name: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -77,4 +329,6 @@ class FlussonicService:
         Corresponds to POST /flussonic/api/save_stream/{name}
         """
         endpoint = f"/flussonic/api/save_stream/{stream_name}"
-        return self._make_request('POST', endpoint, json=config)
+        result = self._make_request('POST', endpoint, json=config)
+        media_cache.patch_stream_config(self.base_url, stream_name, config)
+        return result
@@ -0,0 +1,162 @@
+import asyncio
+import httpx
+from typing import Any, Dict, List
+from app.core.config import settings
+from app.services.circuit_breaker import breakers
+from app.services.flussonic import chunk_streams, credentials_key
+from app.services.media_cache import media_cache
+from app.services.singleflight import AsyncSingleFlight
+from app.services.http_pool import async_client_pool
+from app.services.rate_limit import OriginBusyError, limiters
+
+# Shared by every service instance so identical GETs coalesce across requests.
+_inflight = AsyncSingleFlight()
+
+class AsyncFlussonicService:
+    """
+    An asyncio variant of `FlussonicService` for use inside `async def` route
+    handlers. A slow origin only parks a coroutine instead of a threadpool worker.
+    """
+    def __init__(self, server_url: str, username: str, password: str, timeout: float = settings.FLUSSONIC_TIMEOUT):
+        if not server_url.startswith(('http://', 'https://')):
+            raise ValueError("Server URL must start with http:// or https://")
+
+        self.base_url = server_url.rstrip('/')
+        self.username = username
+        self.auth = httpx.BasicAuth(username, password)
+        self.credentials_key = credentials_key(username, password)
+        self.timeout = timeout
+
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> Any:
+        """
+        Helper method to make requests to the Flussonic API.
+        Concurrent identical GETs to the same server share one upstream request.
+        """
+        if method != 'GET':
+            return await self._send_request(method, endpoint, **kwargs)
+        params = kwargs.get('params') or {}
+        # Calls made with different credentials must not share a result.
+        key = (self.base_url, self.credentials_key, endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+        return await _inflight.do(key, lambda: self._send_request(method, endpoint, **kwargs))
+
+    async def _send_request(self, method: str, endpoint: str, **kwargs) -> Any:
+        url = f"{self.base_url}{endpoint}"
+        client = await async_client_pool.get(self.base_url)
+        # Fail fast while the origin's circuit is open; 5xx responses and
+        # transport errors count against it, 4xx responses do not.
+        breaker = breakers.get(self.base_url)
+        breaker.before_call()
+        # Wait for a slot within the origin's rate and concurrency limits.
+        limiter = limiters.get(self.base_url)
+        try:
+            await limiter.acquire_async()
+        except OriginBusyError:
+            breaker.cancel_call()
+            raise
+        healthy = False
+        try:
+            response = await client.request(method, url, auth=self.auth, timeout=self.timeout, **kwargs)
+            healthy = response.status_code < 500
+            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+            if response.status_code == 204:
+                return None
+            return response.json()
+        except httpx.HTTPStatusError as http_err:
+            # Handle HTTP errors (e.g., 401 Unauthorized, 404 Not Found)
+            print(f"HTTP error occurred: {http_err} - {http_err.response.text}")
+            raise
+        except httpx.ConnectError as conn_err:
+            # Handle connection errors (e.g., DNS failure, refused connection)
+            print(f"Connection error occurred: {conn_err}")
+            raise
+        except httpx.TimeoutException as timeout_err:
+            # Handle request timeout
+            print(f"Timeout error occurred: {timeout_err}")
+            raise
+        except httpx.HTTPError as req_err:
+            # Handle other request exceptions
+            print(f"An unexpected error occurred: {req_err}")
+            raise
+        finally:
+            limiter.release()
+            breaker.record_result(healthy)
+
+    async def _get_media(self, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Returns the `/flussonic/api/media` listing with its name index, served
+        from the per-server media cache while it is fresh. With `use_cache=False`
+        the listing is always fetched by a new request.
+        """
+        if use_cache:
+            entry = media_cache.get(self.base_url)
+            if entry is not None:
+                return entry
+            response_data = await self._make_request('GET', '/flussonic/api/media')
+        else:
+            # A fresh read must not join a listing requested before the call.
+            response_data = await self._send_request('GET', '/flussonic/api/media')
+        return media_cache.set(self.base_url, response_data.get('streams', []))
+
+    async def get_streams(self, use_cache: bool = True) -> list:
+        """
+        Fetches a list of all media streams from the Flussonic server.
+        Corresponds to the `/flussonic/api/media` endpoint.
+        """
+        return (await self._get_media(use_cache))['streams']
+
+    async def get_traffic_report(self, streams: List[str], start_time: int) -> Dict[str, Any]:
+        """
+        Fetches traffic reports for a list of streams since a given time.
+        Corresponds to GET /flussonic/api/get_traffic_reports
+        See `FlussonicService.get_traffic_report` for how long lists are chunked.
+        """
+        chunks = chunk_streams(streams)
+        if len(chunks) <= 1:
+            return await self._get_traffic_chunk(streams, start_time)
+
+        semaphore = asyncio.Semaphore(settings.FLUSSONIC_TRAFFIC_CONCURRENCY)
+
+        async def fetch(chunk: List[str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._get_traffic_chunk(chunk, start_time)
+
+        report: Dict[str, Any] = {}
+        for chunk_report in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+            report.update(chunk_report or {})
+        return report
+
+    async def _get_traffic_chunk(self, streams: List[str], start_time: int) -> Dict[str, Any]:
+        params = {
+            'streams': ','.join(streams),
+            'from': start_time
+        }
+        return await self._make_request('GET', '/flussonic/api/get_traffic_reports', params=params)
+
+    async def get_stream_config(self, stream_name: str, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Fetches the full configuration for a specific stream.
+        See `FlussonicService.get_stream_config`.
+        """
+        stream = (await self._get_media(use_cache))['index'].get(stream_name)
+        if stream is None:
+            raise ValueError(f"Stream '{stream_name}' not found.")
+        # The 'config' key holds the editable configuration
+        return stream.get('config', {})
+
+    async def get_stream_configs(self, stream_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolves the configuration of many streams from a single media listing.
+        Streams that do not exist on the server are left out of the result.
+        """
+        index = (await self._get_media())['index']
+        return {name: index[name].get('config', {}) for name in stream_names if name in index}
+
+    async def update_stream_config(self, stream_name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Updates the configuration for a specific stream using a partial config.
+        Corresponds to POST /flussonic/api/save_stream/{name}
+        """
+        endpoint = f"/flussonic/api/save_stream/{stream_name}"
+        result = await self._make_request('POST', endpoint, json=config)
+        media_cache.patch_stream_config(self.base_url, stream_name, config)
+        return result
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+
+class SessionPool:
+    """
+    A registry of keep-alive `requests.Session` objects, one per Flussonic server.
+    Each session owns its own urllib3 connection pool, so repeated calls to the
+    same origin reuse established TCP/TLS connections instead of reconnecting.
+    """
+    def __init__(self, pool_size: int, keepalive: bool, idle_timeout: float):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, Tuple[requests.Session, float]] = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keepalive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get(self, key: str) -> requests.Session:
+        """Returns the pooled session for a server, creating it on first use."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(key)
+            session = entry[0] if entry else self._create_session()
+            self._sessions[key] = (session, now)
+            return session
+
+    def _evict_idle(self, now: float) -> None:
+        if self.idle_timeout <= 0:
+            return
+        expired = [key for key, (_, last_used) in self._sessions.items() if now - last_used > self.idle_timeout]
+        for key in expired:
+            session, _ = self._sessions.pop(key)
+            session.close()
+
+    def close(self, key: Optional[str] = None) -> None:
+        """Closes the session for one server, or every pooled session if no key is given."""
+        with self._lock:
+            keys = [key] if key is not None else list(self._sessions)
+            for k in keys:
+                entry = self._sessions.pop(k, None)
+                if entry:
+                    entry[0].close()
+
+
+session_pool = SessionPool(
+    pool_size=settings.FLUSSONIC_POOL_SIZE,
+    keepalive=settings.FLUSSONIC_KEEPALIVE,
+    idle_timeout=settings.FLUSSONIC_POOL_IDLE_TIMEOUT,
+)
+
+
+class AsyncClientPool:
+    """
+    The asyncio counterpart of `SessionPool`: one `httpx.AsyncClient` per
+    Flussonic server, so async route handlers share keep-alive connections.
+    """
+    def __init__(self, pool_size: int, keepalive: bool, idle_timeout: float):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self._clients: Dict[str, Tuple[httpx.AsyncClient, float]] = {}
+        # Guards the registry across awaits, so concurrent first uses share one client.
+        self._lock = asyncio.Lock()
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size if self.keepalive else 0,
+            keepalive_expiry=self.idle_timeout if self.idle_timeout > 0 else None,
+        )
+        return httpx.AsyncClient(limits=limits)
+
+    async def get(self, key: str) -> httpx.AsyncClient:
+        """Returns the pooled client for a server, creating it on first use."""
+        now = time.monotonic()
+        async with self._lock:
+            await self._evict_idle(now)
+            entry = self._clients.get(key)
+            client = entry[0] if entry else self._create_client()
+            self._clients[key] = (client, now)
+            return client
+
+    async def _evict_idle(self, now: float) -> None:
+        if self.idle_timeout <= 0:
+            return
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_timeout]
+        for key in expired:
+            client, _ = self._clients.pop(key)
+            await client.aclose()
+
+    async def close(self) -> None:
+        """Closes every pooled client. Called on application shutdown."""
+        async with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+async_client_pool = AsyncClientPool(
+    pool_size=settings.FLUSSONIC_POOL_SIZE,
+    keepalive=settings.FLUSSONIC_KEEPALIVE,
+    idle_timeout=settings.FLUSSONIC_POOL_IDLE_TIMEOUT,
+)
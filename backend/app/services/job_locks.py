@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+
+def db_now(db: Session) -> datetime:
+    """
+    The database server's current time as a naive datetime. Leases shared by
+    several hosts are timed with it, so clock skew between hosts does not
+    matter.
+    """
+    now = db.execute(select(func.current_timestamp(type_=DateTime))).scalar()
+    if isinstance(now, str):
+        now = datetime.fromisoformat(now)
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    return now
+
+
+def _ensure_lock_row(db: Session, name: str) -> None:
+    if db.query(models.JobLock.name).filter(models.JobLock.name == name).first() is not None:
+        return
+    try:
+        db.add(models.JobLock(name=name))
+        db.commit()
+    except IntegrityError:
+        # Another process created it at the same time.
+        db.rollback()
+
+
+def serialize(db: Session, name: str) -> None:
+    """
+    Starts a transaction that holds the `name` lock until it commits or rolls
+    back, so the work done in it never overlaps with another holder's.
+
+    The lock is taken with a write to the lock row before anything else is
+    read, so reads that follow see everything the previous holder committed.
+    Call it at the start of a transaction.
+    """
+    JobLock = models.JobLock
+    while db.query(JobLock).filter(JobLock.name == name).update(
+        {JobLock.locked_at: datetime.utcnow()}, synchronize_session=False
+    ) == 0:
+        # First use of the lock: create the row in its own transaction and
+        # take the lock in a fresh one.
+        try:
+            db.add(JobLock(name=name))
+            db.commit()
+        except IntegrityError:
+            # Another process created it at the same time.
+            db.rollback()
+
+
+def try_lease(db: Session, name: str, owner: str, ttl: float) -> bool:
+    """
+    Takes or renews the `name` lease for `owner` for `ttl` seconds and
+    returns whether `owner` holds it. Only one owner holds a lease at a time;
+    it becomes free once its holder stops renewing it.
+    """
+    _ensure_lock_row(db, name)
+    now = db_now(db)
+    JobLock = models.JobLock
+    claimed = db.query(JobLock).filter(
+        JobLock.name == name,
+        JobLock.owner.is_(None) | (JobLock.owner == owner) | (JobLock.expires_at <= now),
+    ).update({JobLock.owner: owner, JobLock.expires_at: now + timedelta(seconds=ttl)}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def release_lease(db: Session, name: str, owner: str) -> None:
+    db.query(models.JobLock).filter(models.JobLock.name == name, models.JobLock.owner == owner).update(
+        {models.JobLock.owner: None, models.JobLock.expires_at: None}, synchronize_session=False
+    )
+    db.commit()
@@ -0,0 +1,134 @@
+import math
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Iterable, Set
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models, database
+from app.services.job_locks import db_now
+from app.services.traffic_writer import upsert_rows
+
+
+def default_owner() -> str:
+    return settings.COLLECTOR_NODE_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    """
+    Splits the Flussonic servers between collector daemons on several hosts
+    through leases stored in `collector_leases`.
+
+    On every `sync` a daemon heartbeats in `collector_nodes`, renews the leases
+    it holds, releases leases above its fair share (servers / live daemons,
+    rounded up) so newly started daemons can take them, and claims free or
+    expired leases up to that share. Claims are conditional UPDATEs, so two
+    daemons can never hold the same server. A lease that is not renewed within
+    `ttl` seconds expires and the server is picked up by another daemon.
+    Expiry is timed with the database clock, so host clocks need not agree.
+    """
+    def __init__(self, owner: str, ttl: float):
+        self.owner = owner
+        self.ttl = ttl
+        self.owned: Set[int] = set()
+        self._valid_until = 0.0
+
+    def holds(self, server_id: int) -> bool:
+        """Whether this daemon may collect the server; false once the last successful sync is older than the TTL."""
+        return server_id in self.owned and time.monotonic() < self._valid_until
+
+    def _ensure_leases(self, db: Session, server_ids: Set[int]) -> None:
+        existing = {server_id for (server_id,) in db.query(models.CollectorLease.server_id).all()}
+        missing = server_ids - existing
+        if not missing:
+            return
+        try:
+            db.add_all(models.CollectorLease(server_id=server_id) for server_id in missing)
+            db.commit()
+        except IntegrityError:
+            # Another daemon created them at the same time.
+            db.rollback()
+
+    def sync(self, server_ids: Iterable[int], busy: Set[int] = frozenset()) -> Set[int]:
+        """
+        Renews, rebalances and claims leases for `server_ids`. Servers in
+        `busy` (being collected right now) are not released. Returns the
+        servers this daemon now holds.
+        """
+        server_ids = set(server_ids)
+        started = time.monotonic()
+        db: Session = database.SessionLocal()
+        try:
+            now = db_now(db)
+            expires_at = now + timedelta(seconds=self.ttl)
+            upsert_rows(db, models.CollectorNode.__table__, ['owner'], [{'owner': self.owner, 'heartbeat_at': now}])
+            db.commit()
+            self._ensure_leases(db, server_ids)
+
+            Lease = models.CollectorLease
+            db.query(Lease).filter(Lease.owner == self.owner, Lease.expires_at > now).update(
+                {Lease.expires_at: expires_at}, synchronize_session=False
+            )
+            held = {
+                server_id for (server_id,) in
+                db.query(Lease.server_id).filter(Lease.owner == self.owner, Lease.expires_at > now).all()
+            }
+            db.commit()
+
+            live_nodes = (
+                db.query(models.CollectorNode)
+                .filter(models.CollectorNode.heartbeat_at > now - timedelta(seconds=self.ttl))
+                .count()
+            )
+            share = math.ceil(len(server_ids) / max(live_nodes, 1))
+
+            excess = sorted(held - busy)[:max(len(held) - share, 0)]
+            if excess:
+                db.query(Lease).filter(Lease.server_id.in_(excess), Lease.owner == self.owner).update(
+                    {Lease.owner: None, Lease.expires_at: None}, synchronize_session=False
+                )
+                db.commit()
+                held -= set(excess)
+                print(f"Released {len(excess)} servers for other collectors.")
+
+            if len(held) < share:
+                free = Lease.owner.is_(None) | (Lease.expires_at <= now)
+                candidates = [
+                    server_id for (server_id,) in
+                    db.query(Lease.server_id).filter(Lease.server_id.in_(list(server_ids)), free).all()
+                ]
+                for server_id in candidates:
+                    if len(held) >= share:
+                        break
+                    claimed = db.query(Lease).filter(Lease.server_id == server_id, free).update(
+                        {Lease.owner: self.owner, Lease.expires_at: expires_at}, synchronize_session=False
+                    )
+                    db.commit()
+                    if claimed:
+                        held.add(server_id)
+
+            self.owned = held & server_ids
+            self._valid_until = started + self.ttl
+            return self.owned
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def release_all(self) -> None:
+        """Gives up every lease right away, e.g. on shutdown, so other daemons need not wait for expiry."""
+        db: Session = database.SessionLocal()
+        try:
+            db.query(models.CollectorLease).filter(models.CollectorLease.owner == self.owner).update(
+                {models.CollectorLease.owner: None, models.CollectorLease.expires_at: None}, synchronize_session=False
+            )
+            db.query(models.CollectorNode).filter(models.CollectorNode.owner == self.owner).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.owned = set()
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class LoginThrottle:
+    """
+    Limits failed logins per key (username or client IP) within a sliding
+    window of `window` seconds.
+
+    Every attempt is counted as a failure up front, before the password is
+    checked, so a burst of parallel attempts cannot all get through while the
+    first ones are still being verified; a successful login takes its attempt
+    back with `forgive`. At most `max_keys` keys are tracked, dropping the least
+    recently used one.
+    """
+    def __init__(self, window: float, max_keys: int = 100000):
+        self.window = window
+        self.max_keys = max_keys
+        self._attempts: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, now: float) -> Deque[float]:
+        """Needs the lock."""
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            attempts = deque()
+            self._attempts[key] = attempts
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+        self._attempts.move_to_end(key)
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        return attempts
+
+    def hit(self, limits: List[Tuple[str, int]]) -> Optional[float]:
+        """
+        Counts an attempt against every (key, limit) pair. Returns None if the
+        attempt may proceed, or the seconds until it may be retried if any key
+        is over its limit (in which case nothing is counted).
+        """
+        now = time.monotonic()
+        with self._lock:
+            retry_after = None
+            for key, limit in limits:
+                attempts = self._recent(key, now)
+                if len(attempts) >= limit:
+                    wait = attempts[0] + self.window - now
+                    retry_after = max(retry_after or 0.0, wait)
+            if retry_after is not None:
+                return retry_after
+            for key, _ in limits:
+                self._attempts[key].append(now)
+            return None
+
+    def forgive(self, key: str) -> None:
+        """Takes back the most recent attempt counted for `key`, e.g. because it succeeded."""
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts:
+                attempts.pop()
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._attempts.pop(key, None)
+
+login_throttle = LoginThrottle(window=settings.LOGIN_THROTTLE_WINDOW_SECONDS)
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+
+def build_stream_index(streams: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Maps stream names to their entries in a `/flussonic/api/media` listing."""
+    return {stream['name']: stream for stream in streams if 'name' in stream}
+
+
+class MediaCache:
+    """
+    A per-server cache of the `/flussonic/api/media` listing.
+
+    Each entry holds the stream list together with a name -> stream index, so
+    single-stream lookups do not scan the listing. Entries expire after `ttl`
+    seconds and at most `max_servers` listings are kept, evicting the least
+    recently used one. Stream config writes made through `FlussonicService`
+    are patched into the cached listing so the next read does not have to
+    download the whole document again.
+    """
+    def __init__(self, ttl: float, max_servers: int):
+        self.ttl = ttl
+        self.max_servers = max_servers
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_servers > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached entry for a server (`streams` and `index`), or None
+        on a miss or expired entry. The returned entry must not be mutated.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['fetched_at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, streams: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Indexes a freshly fetched stream list, caches it and returns the new entry."""
+        entry = {'streams': streams, 'index': build_stream_index(streams), 'fetched_at': time.monotonic()}
+        if not self.enabled:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_servers:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def patch_stream_config(self, key: str, stream_name: str, config: Dict[str, Any]) -> None:
+        """
+        Applies a successful partial config update to the cached listing.
+        Flussonic merges top-level config keys, so we do the same here. If the
+        stream is not in the cached listing the entry is dropped instead.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            stream = entry['index'].get(stream_name)
+            if stream is None:
+                del self._entries[key]
+                return
+            stream['config'] = {**stream.get('config', {}), **config}
+
+
+media_cache = MediaCache(
+    ttl=settings.FLUSSONIC_MEDIA_CACHE_TTL,
+    max_servers=settings.FLUSSONIC_MEDIA_CACHE_SIZE,
+)
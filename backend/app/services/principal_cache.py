@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+
+
+class StreamAccess:
+    """A stream assigned to a user, with what is needed to reach it on its Flussonic server."""
+    __slots__ = ('stream_name', 'server_id', 'server_name', 'server_url', 'server_username', 'server_password')
+
+    def __init__(self, stream_name: str, server_id: int, server_name: str, server_url: str, server_username: str, server_password: str):
+        self.stream_name = stream_name
+        self.server_id = server_id
+        self.server_name = server_name
+        self.server_url = server_url
+        self.server_username = server_username
+        self.server_password = server_password
+
+
+class Principal:
+    """
+    The authenticated user as seen by the API: just the fields authorization
+    needs, plus every stream assigned to the user (`assignments`, ordered by
+    server) and a stream name -> `StreamAccess` map of them.
+
+    The same name may be assigned on several servers. Stream routes address
+    streams by name, so the map keeps the lowest server id; anything that
+    covers all of a user's streams must use `assignments`.
+    """
+    __slots__ = ('id', 'username', 'is_admin', 'assignments', 'streams')
+
+    def __init__(self, id: int, username: str, is_admin: int, assignments: List[StreamAccess]):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+        self.assignments = assignments
+        self.streams: Dict[str, StreamAccess] = {}
+        for access in assignments:
+            self.streams.setdefault(access.stream_name, access)
+
+
+def load_principal(db: Session, username: str) -> Optional[Principal]:
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None:
+        return None
+    rows = (
+        db.query(
+            models.UserStream.stream_name,
+            models.FlussonicServer.id,
+            models.FlussonicServer.name,
+            models.FlussonicServer.url,
+            models.FlussonicServer.username,
+            models.FlussonicServer.password,
+        )
+        .join(models.FlussonicServer, models.FlussonicServer.id == models.UserStream.server_id)
+        .filter(models.UserStream.user_id == user.id)
+        .order_by(models.UserStream.server_id, models.UserStream.stream_name)
+        .all()
+    )
+    return Principal(user.id, user.username, user.is_admin, [StreamAccess(*row) for row in rows])
+
+
+class PrincipalCache:
+    """
+    An in-process LRU of resolved principals keyed by username, so
+    authenticated requests do not have to look the user up on every call.
+
+    Entries expire after `ttl` seconds (never longer than an access token
+    lives) and at most `max_size` users are kept. Changes to users, their
+    stream assignments and servers made through the ORM in this process evict
+    the affected entries when they are flushed and again after commit; other
+    processes pick them up once the entry expires.
+    """
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, username: str) -> Optional[Principal]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            principal, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl:
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return principal
+
+    def set(self, principal: Principal) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic())
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_users(self, user_ids: Set[int]) -> None:
+        with self._lock:
+            for username in [name for name, (p, _) in self._entries.items() if p.id in user_ids]:
+                del self._entries[username]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    ttl=min(settings.PRINCIPAL_CACHE_TTL, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+)
+
+
+def _affected_users(session: Session) -> Tuple[Set[int], bool]:
+    """Returns the ids of users whose principal changed, and whether a server changed (which may affect anyone)."""
+    user_ids = set()
+    servers_changed = False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User) and obj.id is not None:
+            user_ids.add(obj.id)
+        elif isinstance(obj, models.UserStream) and obj.user_id is not None:
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, models.FlussonicServer):
+            servers_changed = True
+    return user_ids, servers_changed
+
+
+def _invalidate(user_ids: Set[int], servers_changed: bool) -> None:
+    if servers_changed:
+        principal_cache.clear()
+    elif user_ids:
+        principal_cache.invalidate_users(user_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_flush(session: Session, flush_context: Any) -> None:
+    user_ids, servers_changed = _affected_users(session)
+    if user_ids or servers_changed:
+        _invalidate(user_ids, servers_changed)
+        pending = session.info.setdefault('principal_invalidations', {'user_ids': set(), 'servers_changed': False})
+        pending['user_ids'].update(user_ids)
+        pending['servers_changed'] = pending['servers_changed'] or servers_changed
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    # A request may have cached the pre-commit state between flush and commit.
+    pending = session.info.pop('principal_invalidations', None)
+    if pending:
+        _invalidate(pending['user_ids'], pending['servers_changed'])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop('principal_invalidations', None)
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+from app.core.config import settings
+
+
+class OriginBusyError(Exception):
+    """Raised when a call to an origin could not get a rate limit slot within the allowed wait."""
+
+
+class OriginLimiter:
+    """
+    Limits the load put on a single Flussonic origin: a token bucket allows
+    `rate` requests per second with bursts of up to `burst`, and at most
+    `max_in_flight` requests may be running at the same time. Callers wait
+    for a slot for up to `max_wait` seconds and then get `OriginBusyError`.
+    A `rate` or `max_in_flight` of 0 disables that limit. Streamed responses
+    give their slot back once the origin has answered.
+
+    The limiter lives in process memory and is shared by the blocking
+    (`acquire`) and the asyncio (`acquire_async`) clients of that process
+    only; other API workers and collector daemons each keep their own.
+    `LimiterRegistry` splits the configured budget between them.
+    """
+    def __init__(self, rate: float, burst: int, max_in_flight: int, max_wait: float):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.queued = 0
+        self.requests = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def _try_take(self) -> float:
+        """Takes a slot if one is free and returns 0, otherwise the seconds to wait before retrying. Needs the lock."""
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            # Woken up by `release`; the timeout only bounds the wait.
+            return 0.05
+        if self.rate > 0:
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        self.in_flight += 1
+        return 0.0
+
+    def _record_wait(self, waited: float, acquired: bool) -> None:
+        """Needs the lock."""
+        self.queued -= 1
+        if acquired:
+            self.requests += 1
+            self.total_wait += waited
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+        else:
+            self.rejected += 1
+
+    def _busy(self) -> OriginBusyError:
+        return OriginBusyError(f"Flussonic server is at its request limit; no slot within {self.max_wait:g}s.")
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._released.notify()
+
+    def acquire(self) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            while True:
+                delay = self._try_take()
+                waited = time.monotonic() - started
+                if delay == 0:
+                    self._record_wait(waited, True)
+                    return
+                if waited + delay > self.max_wait:
+                    self._record_wait(waited, False)
+                    raise self._busy()
+                self._released.wait(timeout=delay)
+
+    async def acquire_async(self) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self.queued += 1
+        while True:
+            with self._lock:
+                delay = self._try_take()
+                waited = time.monotonic() - started
+                if delay == 0:
+                    self._record_wait(waited, True)
+                    return
+                if waited + delay > self.max_wait:
+                    self._record_wait(waited, False)
+                    raise self._busy()
+            await asyncio.sleep(min(delay, 0.05))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'requests': self.requests,
+                'rejected': self.rejected,
+                'avg_queue_ms': self.total_wait / self.requests * 1000 if self.requests else 0.0,
+                'max_queue_ms': self.max_wait_seen * 1000,
+            }
+
+
+class LimiterRegistry:
+    """
+    One `OriginLimiter` per Flussonic server, keyed by base URL.
+
+    `rate`, `burst` and `max_in_flight` are the budget of a whole deployment;
+    each process gets its `1 / processes` share of it, so that the origin sees
+    at most the configured load when all processes are busy.
+    """
+    def __init__(self, rate: float, burst: int, max_in_flight: int, max_wait: float, processes: int = 1):
+        processes = max(1, processes)
+        self.rate = rate / processes
+        self.burst = max(1, burst // processes)
+        self.max_in_flight = max(1, max_in_flight // processes) if max_in_flight > 0 else 0
+        self.max_wait = max_wait
+        self._limiters: Dict[str, OriginLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> OriginLimiter:
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = OriginLimiter(self.rate, self.burst, self.max_in_flight, self.max_wait)
+                self._limiters[key] = limiter
+            return limiter
+
+
+limiters = LimiterRegistry(
+    rate=settings.FLUSSONIC_RATE_LIMIT,
+    burst=settings.FLUSSONIC_RATE_BURST,
+    max_in_flight=settings.FLUSSONIC_MAX_IN_FLIGHT,
+    max_wait=settings.FLUSSONIC_RATE_MAX_WAIT,
+    processes=settings.FLUSSONIC_RATE_PROCESSES,
+)
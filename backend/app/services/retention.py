@@ -0,0 +1,189 @@
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models, database
+from app.services.rollups import refresh_server_rollups
+
+TABLE = models.TrafficUsage.__tablename__
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _partition_clause(month: date) -> str:
+    return f"PARTITION {_partition_name(month)} VALUES LESS THAN (TO_DAYS('{_next_month(month):%Y-%m-%d}'))"
+
+
+def _is_mysql(db: Session) -> bool:
+    return db.get_bind().dialect.name == 'mysql'
+
+
+def _mysql_partitions(db: Session) -> List[Tuple[str, str]]:
+    """Returns (name, upper bound) for each partition, or an empty list if the table is not partitioned."""
+    rows = db.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': TABLE}).all()
+    return [(name, bound) for name, bound in rows if name is not None]
+
+
+def ensure_partitions(db: Session, months_ahead: int = settings.TRAFFIC_PARTITION_MONTHS_AHEAD):
+    """
+    Makes sure `traffic_usage` is range-partitioned by month on MySQL, with
+    partitions up to `months_ahead` months in the future. The first call on an
+    existing table converts it in place, which rewrites the table once. This is
+    a no-op on other databases.
+    """
+    if not _is_mysql(db):
+        return
+
+    last_month = _month_start(date.today())
+    for _ in range(months_ahead):
+        last_month = _next_month(last_month)
+
+    partitions = _mysql_partitions(db)
+    if not partitions:
+        oldest = db.query(func.min(models.TrafficUsage.timestamp)).scalar()
+        month = _month_start(oldest.date() if oldest else date.today())
+        clauses = []
+        while month <= last_month:
+            clauses.append(_partition_clause(month))
+            month = _next_month(month)
+        clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        db.execute(text(f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(`timestamp`)) ({', '.join(clauses)})"))
+        print(f"Partitioned {TABLE} by month.")
+        return
+
+    existing = {name for name, _ in partitions}
+    newest = max(datetime.strptime(name[1:], "%Y%m").date() for name in existing if name != 'pmax')
+    clauses = []
+    month = _next_month(newest)
+    while month <= last_month:
+        clauses.append(_partition_clause(month))
+        month = _next_month(month)
+    if clauses:
+        clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        db.execute(text(f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})"))
+
+
+def _downsample_day(db: Session, day: date):
+    """Rebuilds the rollups covering `day` from raw data before that raw data is removed."""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    server_ids = (
+        db.query(models.TrafficUsage.server_id)
+        .filter(models.TrafficUsage.timestamp >= start, models.TrafficUsage.timestamp < end)
+        .distinct()
+        .all()
+    )
+    for (server_id,) in server_ids:
+        refresh_server_rollups(server_id, [(start, end - timedelta(microseconds=1))])
+
+
+def _drop_expired_partitions(db: Session, cutoff: date) -> int:
+    """Downsamples and drops every monthly partition that ends on or before `cutoff`."""
+    dropped = 0
+    for name, _ in _mysql_partitions(db):
+        if name == 'pmax':
+            continue
+        month = datetime.strptime(name[1:], "%Y%m").date()
+        if _next_month(month) > cutoff:
+            continue
+        day = month
+        while day < _next_month(month):
+            _downsample_day(db, day)
+            day += timedelta(days=1)
+        db.commit()
+        db.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {name}"))
+        print(f"Dropped traffic partition {name}.")
+        dropped += 1
+    return dropped
+
+
+def _delete_expired_days(db: Session, cutoff: date) -> int:
+    """
+    Portable fallback: downsamples and deletes raw data one day at a time, so
+    each DELETE stays small and is committed on its own.
+    """
+    oldest = db.query(func.min(models.TrafficUsage.timestamp)).scalar()
+    if oldest is None:
+        return 0
+    deleted = 0
+    day = oldest.date()
+    while day < cutoff:
+        _downsample_day(db, day)
+        start = datetime.combine(day, datetime.min.time())
+        deleted += (
+            db.query(models.TrafficUsage)
+            .filter(models.TrafficUsage.timestamp >= start, models.TrafficUsage.timestamp < start + timedelta(days=1))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        day += timedelta(days=1)
+    return deleted
+
+
+def _delete_expired_hourly(db: Session, cutoff: date) -> int:
+    """Hourly rollups are kept for a shorter time than daily ones; delete the expired days."""
+    oldest = db.query(func.min(models.TrafficHourly.hour)).scalar()
+    if oldest is None:
+        return 0
+    deleted = 0
+    day = oldest.date()
+    while day < cutoff:
+        start = datetime.combine(day, datetime.min.time())
+        deleted += (
+            db.query(models.TrafficHourly)
+            .filter(models.TrafficHourly.hour >= start, models.TrafficHourly.hour < start + timedelta(days=1))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        day += timedelta(days=1)
+    return deleted
+
+
+def apply_retention():
+    """
+    Runs one retention pass: creates upcoming partitions, folds raw traffic
+    older than `TRAFFIC_RAW_RETENTION_DAYS` into the rollups and removes it,
+    and expires hourly rollups older than `TRAFFIC_HOURLY_RETENTION_DAYS`.
+    Daily rollups are kept indefinitely. A retention setting of 0 disables it.
+    """
+    print("Starting traffic retention...")
+    db: Session = database.SessionLocal()
+    try:
+        ensure_partitions(db)
+        db.commit()
+
+        if settings.TRAFFIC_RAW_RETENTION_DAYS > 0:
+            cutoff = date.today() - timedelta(days=settings.TRAFFIC_RAW_RETENTION_DAYS)
+            if _is_mysql(db):
+                dropped = _drop_expired_partitions(db, cutoff)
+                print(f"Dropped {dropped} raw traffic partitions older than {cutoff}.")
+            else:
+                deleted = _delete_expired_days(db, cutoff)
+                print(f"Deleted {deleted} raw traffic rows older than {cutoff}.")
+
+        if settings.TRAFFIC_HOURLY_RETENTION_DAYS > 0:
+            cutoff = date.today() - timedelta(days=settings.TRAFFIC_HOURLY_RETENTION_DAYS)
+            deleted = _delete_expired_hourly(db, cutoff)
+            print(f"Deleted {deleted} hourly rollup rows older than {cutoff}.")
+    except Exception as e:
+        print(f"Error applying traffic retention: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    print("Traffic retention finished.")
@@ -0,0 +1,207 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db import models, database
+from app.services.job_locks import serialize
+from app.services.traffic_writer import upsert_rows
+
+
+def _hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_bucket(dialect: str, column):
+    """SQL expression truncating a timestamp to its hour, or None if the database has none we know of."""
+    if dialect == 'mysql':
+        return func.date_format(column, '%Y-%m-%d %H:00:00')
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', column)
+    if dialect == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:00:00', column)
+    return None
+
+
+def _as_datetime(value) -> datetime:
+    # MySQL and SQLite return the formatted bucket as a string.
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _hourly_totals(db: Session, server_id: int, hour_start: datetime, hour_end: datetime) -> Dict[Tuple[str, datetime], int]:
+    filters = (
+        models.TrafficUsage.server_id == server_id,
+        models.TrafficUsage.timestamp >= hour_start,
+        models.TrafficUsage.timestamp < hour_end,
+    )
+    bucket = _hour_bucket(db.get_bind().dialect.name, models.TrafficUsage.timestamp)
+    if bucket is not None:
+        rows = (
+            db.query(models.TrafficUsage.stream_name, bucket, func.sum(models.TrafficUsage.bytes_used))
+            .filter(*filters)
+            .group_by(models.TrafficUsage.stream_name, bucket)
+        )
+        return {(stream_name, _as_datetime(hour)): int(total) for stream_name, hour, total in rows}
+
+    hourly: Dict[Tuple[str, datetime], int] = defaultdict(int)
+    raw = db.query(models.TrafficUsage.stream_name, models.TrafficUsage.timestamp, models.TrafficUsage.bytes_used).filter(*filters)
+    for stream_name, timestamp, bytes_used in raw:
+        hourly[(stream_name, _hour(timestamp))] += bytes_used
+    return hourly
+
+
+def refresh_rollups(db: Session, server_id: int, start: datetime, end: datetime) -> Tuple[date, date]:
+    """
+    Recomputes the hourly and daily rollups of one server for the hours
+    touched by data points between `start` and `end` (inclusive), and returns
+    the [first, last) days they cover.
+
+    Whole buckets are rebuilt from the level below, so re-ingesting the same
+    points (e.g. the collector's overlap window) never double counts. The
+    caller owns the transaction and must hold the server's rollup lock; use
+    `refresh_server_rollups` unless you need to.
+    """
+    hour_start = _hour(start)
+    hour_end = _hour(end) + timedelta(hours=1)
+    day_start = hour_start.date()
+    day_end = _hour(end).date() + timedelta(days=1)
+
+    # Hourly buckets from raw data points, summed by the database.
+    hourly = _hourly_totals(db, server_id, hour_start, hour_end)
+    upsert_rows(db, models.TrafficHourly.__table__, ['server_id', 'stream_name', 'hour'], [
+        {'server_id': server_id, 'stream_name': stream_name, 'hour': hour, 'bytes_used': total}
+        for (stream_name, hour), total in hourly.items()
+    ])
+
+    # Daily buckets from the hourly rollup, covering whole days.
+    daily: Dict[Tuple[str, date], int] = defaultdict(int)
+    hours = (
+        db.query(models.TrafficHourly.stream_name, models.TrafficHourly.hour, models.TrafficHourly.bytes_used)
+        .filter(
+            models.TrafficHourly.server_id == server_id,
+            models.TrafficHourly.hour >= datetime.combine(day_start, datetime.min.time()),
+            models.TrafficHourly.hour < datetime.combine(day_end, datetime.min.time()),
+        )
+    )
+    for stream_name, hour, bytes_used in hours:
+        daily[(stream_name, hour.date())] += bytes_used
+    upsert_rows(db, models.TrafficDaily.__table__, ['server_id', 'stream_name', 'day'], [
+        {'server_id': server_id, 'stream_name': stream_name, 'day': day, 'bytes_used': total}
+        for (stream_name, day), total in daily.items()
+    ])
+    return day_start, day_end
+
+
+def _server_lock(server_id: int) -> str:
+    return f"rollups:{server_id}"
+
+
+def _refresh_server_days(server_id: int, ranges: List[Tuple[datetime, datetime]]) -> Tuple[date, date]:
+    """Runs `refresh_rollups` for each range in one transaction under the server's rollup lock."""
+    db: Session = database.SessionLocal()
+    try:
+        serialize(db, _server_lock(server_id))
+        days = [refresh_rollups(db, server_id, start, end) for start, end in ranges]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return min(start for start, _ in days), max(end for _, end in days)
+
+
+def refresh_server_rollups(server_id: int, ranges: List[Tuple[datetime, datetime]]) -> None:
+    """
+    Recomputes one server's rollups for data points committed in the given
+    (start, end) ranges, then the per-user totals of the days they cover.
+
+    The collector, ingest requests and maintenance jobs may write the same
+    server's data at the same time. Each rebuild runs in its own transaction,
+    serialized per server, so it sees every point committed before it and the
+    last one to finish has the complete totals.
+    """
+    if not ranges:
+        return
+    refresh_user_rollups(server_id, *_refresh_server_days(server_id, ranges))
+
+
+def refresh_user_rollups(server_id: int, day_start: date, day_end: date) -> None:
+    """
+    Recomputes the per-user daily totals in [day_start, day_end) for every
+    user with a stream on this server, from committed `traffic_daily` rows.
+
+    A user's total spans all of their servers, which other collector threads,
+    daemons or ingest requests may be updating at the same time. Runs in its
+    own transaction, serialized across processes by the `user_rollups` lock,
+    so each recomputation sees what the previous ones committed.
+    """
+    db: Session = database.SessionLocal()
+    try:
+        serialize(db, 'user_rollups')
+        user_ids = db.query(models.UserStream.user_id).filter(models.UserStream.server_id == server_id).distinct()
+        user_days = (
+            db.query(models.UserStream.user_id, models.TrafficDaily.day, func.sum(models.TrafficDaily.bytes_used))
+            .join(
+                models.TrafficDaily,
+                (models.TrafficDaily.server_id == models.UserStream.server_id)
+                & (models.TrafficDaily.stream_name == models.UserStream.stream_name),
+            )
+            .filter(
+                models.UserStream.user_id.in_(user_ids),
+                models.TrafficDaily.day >= day_start,
+                models.TrafficDaily.day < day_end,
+            )
+            .group_by(models.UserStream.user_id, models.TrafficDaily.day)
+        )
+        upsert_rows(db, models.UserTrafficDaily.__table__, ['user_id', 'day'], [
+            {'user_id': user_id, 'day': day, 'bytes_used': int(total)}
+            for user_id, day, total in user_days
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def rebuild_rollups(start: Optional[datetime] = None, end: Optional[datetime] = None, server_ids: Optional[List[int]] = None):
+    """
+    Rebuilds every rollup from the raw `traffic_usage` rows between `start`
+    and `end` (naive UTC; default: all stored data), one server and day per
+    transaction. Needed once for raw data stored before the rollups existed,
+    and safe to re-run at any time.
+    """
+    print("Starting rollup rebuild...")
+    db: Session = database.SessionLocal()
+    try:
+        query = db.query(models.FlussonicServer.id)
+        if server_ids:
+            query = query.filter(models.FlussonicServer.id.in_(server_ids))
+        for (server_id,) in query.all():
+            first, last = (
+                db.query(func.min(models.TrafficUsage.timestamp), func.max(models.TrafficUsage.timestamp))
+                .filter(models.TrafficUsage.server_id == server_id)
+                .one()
+            )
+            if first is None:
+                continue
+            first = max(first, start) if start else first
+            last = min(last, end) if end else last
+            day = first.date()
+            while day <= last.date():
+                day_start = datetime.combine(day, datetime.min.time())
+                _refresh_server_days(server_id, [(day_start, day_start + timedelta(days=1) - timedelta(microseconds=1))])
+                day += timedelta(days=1)
+            if first <= last:
+                refresh_user_rollups(server_id, first.date(), last.date() + timedelta(days=1))
+            print(f"Rebuilt rollups of server {server_id} from {first.date()} to {last.date()}.")
+    except Exception as e:
+        print(f"Error rebuilding rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    print("Rollup rebuild finished.")
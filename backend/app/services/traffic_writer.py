@@ -0,0 +1,104 @@
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Set, Tuple
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+
+# (server_id, stream_name, timestamp, bytes_used)
+TrafficRow = Tuple[int, str, datetime, int]
+TRAFFIC_KEY = ['server_id', 'stream_name', 'timestamp']
+
+
+def _batches(rows: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _upsert_statement(dialect: str, table, key_columns: List[str], values: List[dict]):
+    """Builds a multi-row INSERT that overwrites the non-key columns on key conflicts."""
+    update_columns = [name for name in values[0] if name not in key_columns]
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(values)
+        return stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update_columns})
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(values)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={name: stmt.excluded[name] for name in update_columns},
+        )
+    return None
+
+
+def _existing_keys(db: Session, table, key_columns: List[str], values: List[dict]) -> Set[tuple]:
+    """Returns the keys of `values` that already have a row in `table`, with one SELECT."""
+    keys = [tuple(v[name] for name in key_columns) for v in values]
+    return set(
+        tuple(row) for row in db.execute(
+            select(*[table.c[name] for name in key_columns]).where(
+                or_(*[and_(*[table.c[name] == k for name, k in zip(key_columns, key)]) for key in keys])
+            )
+        ).all()
+    )
+
+
+def _insert_missing(db: Session, table, key_columns: List[str], values: List[dict]) -> None:
+    """Portable fallback: one SELECT per batch to find existing keys, then a multi-row INSERT."""
+    keys = [tuple(v[name] for name in key_columns) for v in values]
+    existing = _existing_keys(db, table, key_columns, values)
+    missing = [v for v, k in zip(values, keys) if k not in existing]
+    if missing:
+        db.execute(insert(table).values(missing))
+
+
+def upsert_rows(db: Session, table, key_columns: List[str], values: List[dict], batch_size: int = settings.COLLECTOR_BATCH_SIZE) -> None:
+    """
+    Inserts `values` into `table` with multi-row statements of up to
+    `batch_size` rows, updating rows whose `key_columns` already exist. On
+    MySQL, PostgreSQL and SQLite existing rows are overwritten; other databases
+    only insert the missing ones.
+    """
+    dialect = db.get_bind().dialect.name
+    for batch in _batches(values, batch_size):
+        stmt = _upsert_statement(dialect, table, key_columns, batch)
+        if stmt is not None:
+            db.execute(stmt)
+        else:
+            _insert_missing(db, table, key_columns, batch)
+
+
+def upsert_traffic(db: Session, rows: Iterable[TrafficRow], batch_size: int = settings.COLLECTOR_BATCH_SIZE) -> int:
+    """
+    Writes traffic data points in chunks of `batch_size` rows, deduplicating on
+    (server_id, stream_name, timestamp); points that already exist get their
+    byte count refreshed. Returns the number of points that were not stored
+    yet; the caller owns the transaction.
+    """
+    table = models.TrafficUsage.__table__
+    inserted = 0
+    for batch in _batches(rows, batch_size):
+        # Collapse duplicate keys within a batch; a multi-row upsert may not touch a row twice.
+        unique = {(row[0], row[1], row[2]): row for row in batch}
+        values = [
+            {'server_id': server_id, 'stream_name': stream_name, 'timestamp': timestamp, 'bytes_used': bytes_used}
+            for server_id, stream_name, timestamp, bytes_used in unique.values()
+        ]
+        # Row counts of multi-row upserts do not tell new rows from unchanged
+        # ones on every backend (MySQL reports both as 1 with CLIENT_FOUND_ROWS),
+        # so look the keys up first.
+        existing = _existing_keys(db, table, TRAFFIC_KEY, values)
+        upsert_rows(db, table, TRAFFIC_KEY, values, batch_size)
+        inserted += len(values) - len(existing)
+    return inserted
@@ -1,78 +1,212 @@
+import argparse
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.db import models, database
-from app.services.flussonic import FlussonicService
+from app.services.flussonic import FlussonicService, UpstreamStats
+from app.services.rollups import refresh_server_rollups
+from app.services.traffic_writer import upsert_traffic
 
-def collect_usage_data():
+def _get_watermark(db: Session, server_id: int) -> Optional[datetime]:
+    watermark = db.query(models.CollectionWatermark).filter(models.CollectionWatermark.server_id == server_id).first()
+    return watermark.last_timestamp if watermark else None
+
+def _get_start_time(watermark: Optional[datetime]) -> int:
     """
-    This function is intended to be run as a periodic background job.
-    It fetches traffic data for all streams on all registered servers.
+    Returns the Unix timestamp (seconds) to request traffic data from: the
+    server's watermark minus a small overlap for late data, or the initial
+    lookback window if the server has never been collected.
     """
-    print("Starting traffic data collection...")
-    db: Session = next(database.get_db())
-    
-    servers = db.query(models.FlussonicServer).all()
-    if not servers:
-        print("No Flussonic servers configured. Exiting.")
-        return
+    if watermark is None:
+        return int(time.time()) - settings.COLLECTOR_INITIAL_LOOKBACK_HOURS * 3600
+    start = watermark - timedelta(minutes=settings.COLLECTOR_OVERLAP_MINUTES)
+    return int(start.replace(tzinfo=timezone.utc).timestamp())
 
-    # We want to get data for the last 24 hours.
-    # Flussonic's 'from' parameter expects a Unix timestamp in seconds.
-    start_time = int((datetime.utcnow() - timedelta(days=1)).timestamp())
+def _advance_watermark(db: Session, server_id: int, latest: datetime):
+    watermark = db.query(models.CollectionWatermark).filter(models.CollectionWatermark.server_id == server_id).first()
+    if watermark is None:
+        db.add(models.CollectionWatermark(server_id=server_id, last_timestamp=latest))
+    elif latest > watermark.last_timestamp:
+        watermark.last_timestamp = latest
 
-    for server in servers:
+def collect_server_usage(server_id: int) -> Optional[models.CollectorRun]:
+    """
+    Fetches and stores traffic data for a single server.
+    Only data since the server's last stored point is requested. Each call
+    uses its own database session, so a failure on one server only rolls back
+    that server's records, and its watermark only advances with them.
+    The run's metrics are stored in `collector_runs` and returned.
+    """
+    db: Session = database.SessionLocal()
+    try:
+        server = db.query(models.FlussonicServer).filter(models.FlussonicServer.id == server_id).first()
+        if not server:
+            return None
         print(f"Processing server: {server.name} ({server.url})")
+        run = models.CollectorRun(server_id=server.id, started_at=datetime.utcnow())
+        upstream = UpstreamStats()
+        parsed = written = 0
+        upstream_wait = 0.0
+        write_started = None
+        rollup_range = None
         try:
             flussonic_service = FlussonicService(
                 server_url=server.url,
                 username=server.username,
                 password=server.password
             )
+            flussonic_service.stats = upstream
+            # Bound the whole collection of this server, not just each request.
+            flussonic_service.deadline = time.monotonic() + settings.COLLECTOR_SERVER_TIMEOUT
             
             # Get all streams on the server
-            streams_on_server = flussonic_service.get_streams()
+            streams_on_server = flussonic_service.get_streams(use_cache=False)
             stream_names = [s['name'] for s in streams_on_server if 'name' in s]
 
             if not stream_names:
                 print(f"No streams found on server {server.name}.")
-                continue
-
-            # Fetch traffic report for all streams on this server
-            traffic_data = flussonic_service.get_traffic_report(stream_names, start_time)
-
-            # The report returns data per stream
-            for stream_name, usage_list in traffic_data.items():
-                for usage_record in usage_list:
-                    # 'usage_record' is a tuple: [timestamp_ms, bytes]
-                    record_time = datetime.utcfromtimestamp(usage_record[0] / 1000)
-                    bytes_used = usage_record[1]
-
-                    # Check if this record already exists to avoid duplicates
-                    existing_record = db.query(models.TrafficUsage).filter(
-                        models.TrafficUsage.stream_name == stream_name,
-                        models.TrafficUsage.server_id == server.id,
-                        models.TrafficUsage.timestamp == record_time
-                    ).first()
-
-                    if not existing_record:
-                        new_usage = models.TrafficUsage(
-                            server_id=server.id,
-                            stream_name=stream_name,
-                            bytes_used=bytes_used,
-                            timestamp=record_time
-                        )
-                        db.add(new_usage)
+                run.status = 'no_streams'
+            else:
+                # Stream the traffic report for all streams on this server straight
+                # into batched upserts, tracking the time range that was touched.
+                watermark = _get_watermark(db, server.id)
+                records = iter(flussonic_service.iter_traffic_report(stream_names, _get_start_time(watermark)))
+                earliest = latest = None
+
+                def rows():
+                    nonlocal earliest, latest, parsed, upstream_wait
+                    while True:
+                        # Time spent waiting for upstream data is not DB write time.
+                        waited = time.perf_counter()
+                        record = next(records, None)
+                        upstream_wait += time.perf_counter() - waited
+                        if record is None:
+                            return
+                        stream_name, timestamp_ms, bytes_used = record
+                        record_time = datetime.utcfromtimestamp(timestamp_ms / 1000)
+                        parsed += 1
+                        earliest = record_time if earliest is None else min(earliest, record_time)
+                        latest = record_time if latest is None else max(latest, record_time)
+                        yield server.id, stream_name, record_time, bytes_used
+
+                write_started = time.perf_counter()
+                written = upsert_traffic(db, rows())
+
+                if latest is not None:
+                    rollup_range = (earliest, latest)
+                    _advance_watermark(db, server.id, latest)
+                run.status = 'success'
 
             db.commit()
-            print(f"Successfully collected traffic data for server: {server.name}")
+            if run.status == 'success':
+                print(f"Successfully collected traffic data for server: {server.name}")
+            if rollup_range is not None:
+                # Rollups are rebuilt from committed data, so concurrent writers to this server are all counted.
+                try:
+                    refresh_server_rollups(server.id, [rollup_range])
+                except Exception as e:
+                    print(f"Error updating traffic rollups for server {server.name}: {e}")
 
         except Exception as e:
             print(f"Error processing server {server.name}: {e}")
             db.rollback() # Rollback changes for the failed server
+            run.status = 'failed'
+            run.error = str(e)[:500]
 
+        # Record the run's metrics in their own transaction, also for failed runs.
+        run.finished_at = datetime.utcnow()
+        run.upstream_calls = upstream.calls
+        run.upstream_ms = int(upstream.total_ms)
+        run.upstream_max_ms = int(upstream.max_ms)
+        run.payload_bytes = upstream.payload_bytes
+        run.records_parsed = parsed
+        # Points already stored (overlap re-reads) and repeated keys count as duplicates.
+        run.records_inserted = written if run.status == 'success' else 0
+        run.records_deduplicated = parsed - written if run.status == 'success' else 0
+        if write_started is not None:
+            run.db_write_ms = int(((time.perf_counter() - write_started) - upstream_wait) * 1000)
+        try:
+            db.add(run)
+            db.commit()
+            db.refresh(run)
+            db.expunge(run)
+        except Exception as e:
+            print(f"Could not store collector run metrics for server {server.name}: {e}")
+            db.rollback()
+        return run
+    finally:
+        db.close()
+
+
+def collect_usage_data():
+    """
+    This function is intended to be run as a periodic background job.
+    It fetches traffic data for all streams on all registered servers,
+    querying up to `COLLECTOR_CONCURRENCY` servers at the same time.
+    """
+    print("Starting traffic data collection...")
+    db: Session = database.SessionLocal()
+    try:
+        server_ids = [server_id for (server_id,) in db.query(models.FlussonicServer.id).all()]
+    finally:
+        db.close()
+
+    if not server_ids:
+        print("No Flussonic servers configured. Exiting.")
+        return
+
+    runs = []
+    with ThreadPoolExecutor(max_workers=settings.COLLECTOR_CONCURRENCY) as executor:
+        futures = [executor.submit(collect_server_usage, server_id) for server_id in server_ids]
+        for future in as_completed(futures):
+            run = future.result()
+            if run is not None:
+                runs.append(run)
+
+    for run in sorted(runs, key=lambda r: r.server_id):
+        print(
+            f"  server {run.server_id}: {run.status}, {run.upstream_calls} upstream calls "
+            f"({run.upstream_ms} ms, max {run.upstream_max_ms} ms, {run.payload_bytes} bytes), "
+            f"{run.records_parsed} records parsed, {run.records_inserted} new, "
+            f"{run.records_deduplicated} duplicates, DB writes {run.db_write_ms} ms"
+        )
     print("Traffic data collection finished.")
 
 if __name__ == "__main__":
-    # This allows running the script directly for testing
-    collect_usage_data()
+    # Run once (e.g. from cron) by default, stay resident with `daemon`, run a
+    # single traffic retention pass with `retention`, load history with `backfill`,
+    # or rebuild the rollups from raw data already stored with `rebuild-rollups`.
+    parser = argparse.ArgumentParser(description="Collect traffic usage data from Flussonic servers.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("collect", help="Collect new traffic data from all servers once (default).")
+    subparsers.add_parser("daemon", help="Run the resident collector daemon.")
+    subparsers.add_parser("retention", help="Apply traffic retention once.")
+    rebuild_parser = subparsers.add_parser("rebuild-rollups", help="Rebuild the traffic rollups from stored raw data.")
+    rebuild_parser.add_argument("--start", type=datetime.fromisoformat, help="UTC start (default: oldest stored data)")
+    rebuild_parser.add_argument("--end", type=datetime.fromisoformat, help="UTC end (default: newest stored data)")
+    rebuild_parser.add_argument("--servers", type=lambda v: [int(i) for i in v.split(",")], help="Comma separated server IDs (default: all)")
+    backfill_parser = subparsers.add_parser("backfill", help="Load historical traffic data for a date range.")
+    backfill_parser.add_argument("--start", required=True, type=datetime.fromisoformat, help="UTC start, e.g. 2024-01-01")
+    backfill_parser.add_argument("--end", required=True, type=datetime.fromisoformat, help="UTC end (exclusive)")
+    backfill_parser.add_argument("--servers", type=lambda v: [int(i) for i in v.split(",")], help="Comma separated server IDs (default: all)")
+    backfill_parser.add_argument("--window-hours", type=int, default=settings.BACKFILL_WINDOW_HOURS)
+    backfill_parser.add_argument("--concurrency", type=int, default=settings.BACKFILL_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.command == "daemon":
+        from app.services.collector_daemon import run_collector_daemon
+        run_collector_daemon()
+    elif args.command == "retention":
+        from app.services.retention import apply_retention
+        apply_retention()
+    elif args.command == "rebuild-rollups":
+        from app.services.rollups import rebuild_rollups
+        rebuild_rollups(args.start, args.end, args.servers)
+    elif args.command == "backfill":
+        from app.services.backfill import run_backfill
+        run_backfill(args.start, args.end, args.servers, window_hours=args.window_hours, concurrency=args.concurrency)
+    else:
+        collect_usage_data()
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
-from app.api import auth, admin_servers, client_dashboard
+from app.api import auth, admin_servers, admin_collector, client_dashboard, ingest
+from app.services.http_pool import async_client_pool, session_pool
 
 
 
@@ -12,7 +13,15 @@ app = FastAPI(
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(admin_servers.router, prefix="/api/admin/servers", tags=["admin-servers"])
+app.include_router(admin_collector.router, prefix="/api/admin/collector", tags=["admin-collector"])
 app.include_router(client_dashboard.router, prefix="/api/client", tags=["client"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+
+
+@app.on_event("shutdown")
+async def close_flussonic_connections():
+    await async_client_pool.close()
+    session_pool.close()
 
 
 @app.get("/")
@@ -314,15 +314,18 @@ if __name__ == "__main__":
                 f.write(content)
     
     def setup_cron_job(self):
-        """Setup cron job for usage collector"""
-        self.log("Setting up cron job...")
+        """Setup the usage collector daemon (or an hourly cron job as a fallback)"""
+        self.log("Setting up usage collector...")
         
         python_path = os.path.join(self.backend_path, "venv", "bin", "python")
-        collector_script = os.path.join(self.backend_path, "backend", "app", "services", "usage_collector.py")
+        backend_dir = os.path.join(self.backend_path, "backend")
         
-        cron_command = f"0 * * * * cd {self.backend_path} && {python_path} {collector_script}"
+        daemon_command = f"cd {backend_dir} && {python_path} -m app.services.usage_collector daemon"
+        cron_command = f"0 * * * * cd {backend_dir} && {python_path} -m app.services.usage_collector"
         
-        self.log("Add the following cron job in aaPanel:")
+        self.log("Add the following daemon in aaPanel Supervisor (recommended):")
+        self.log(f"Command: {daemon_command}")
+        self.log("Or, if Supervisor is not available, add this cron job in aaPanel:")
         self.log(f"Command: {cron_command}")
         self.log("Schedule: Every hour (0 * * * *)")
     
@@ -397,9 +400,9 @@ Database User: {self.db_user}
    source venv/bin/activate
    python backend/create_admin.py
 
-5. Add cron job in aaPanel:
-   Schedule: 0 * * * *
-   Command: cd {self.backend_path} && venv/bin/python backend/app/services/usage_collector.py
+5. Add the usage collector daemon in aaPanel Supervisor:
+   Command: cd {self.backend_path}/backend && ../venv/bin/python -m app.services.usage_collector daemon
+   (Fallback: hourly cron job running the same command without "daemon")
 
 6. Test deployment:
    - Backend API: https://{self.backend_domain}/docs